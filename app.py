@@ -1,13 +1,22 @@
 import streamlit as st
-import json
-import pandas as pd
+import asyncio
+import csv
+import hashlib
+import html
+import itertools
+import tempfile
+import orjson
 import time
 import re
-from typing import List, Dict, Any
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Dict, Any, Callable, Optional
 from io import StringIO
 from gemini_search import GeminiProductSearcher, validate_api_key, format_specifications
-from multi_source import IcecatSearcher, GS1Searcher, MultiSourceSearcher
-from config import DATA_SOURCES
+from multi_source import IcecatSearcher, GS1Searcher, MultiSourceSearcher, primary_source
+from search_cache import SearchCache, make_namespace
+from config import DATA_SOURCES, GEMINI_BATCH_SIZE
 
 # Try to load API keys from file (if available)
 try:
@@ -18,6 +27,30 @@ except ImportError:
     DEFAULT_GEMINI_KEY = ""
     DEFAULT_ICECAT_KEY = ""
 
+# Bulk results columns, in export order
+BULK_FIELDS = ("query", "brand", "model", "category", "price_range", "availability", "specifications", "sources")
+# Low-cardinality columns are stored as categories, free text as Arrow-backed strings
+BULK_DTYPES = {"category": "category", "availability": "category",
+               "brand": "string[pyarrow]", "model": "string[pyarrow]"}
+BULK_PREVIEW_EVERY = 5  # refresh the live results preview after this many completed searches
+BULK_PREVIEW_ROWS = 50
+BULK_SPEC_PREVIEW_CHARS = 120  # the on-screen table truncates specifications; exports keep them whole
+BULK_PROGRESS_INTERVAL = 0.05  # seconds between progress bar updates (~20 per second)
+
+# HTML templates for product cards, bound once at import
+PRODUCT_CARD_TEMPLATE = """
+<div class="product-card">
+    <h3>🔍 Search Query: {query}</h3>
+    <h2>{brand} {model}</h2>
+    <p><strong>Category:</strong> {category}</p>
+    <p><strong>Price Range:</strong> {price_range}</p>
+    <p><strong>Availability:</strong> {availability}</p>
+    {searched_sources}
+</div>
+""".format
+SEARCHED_SOURCES_TEMPLATE = '<p><strong>Sources Searched:</strong> {}</p>'.format
+SPEC_ITEM_TEMPLATE = '<div class="spec-item"><strong>{key}:</strong><br>{value}</div>'.format
+
 # Configure page
 st.set_page_config(
     page_title="AI Product Spec Finder",
@@ -49,39 +82,205 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def search_with_multi_sources(query: str, searchers: Dict[str, Any], enabled_sources: List[str]) -> Dict[str, Any]:
-    """
-    Search for product specifications using multiple sources.
-    """
-    multi_searcher = MultiSourceSearcher(
+def build_multi_searcher(searchers: Dict[str, Any]) -> MultiSourceSearcher:
+    """Create a multi-source searcher from the configured per-source searchers."""
+    return MultiSourceSearcher(
         gemini_searcher=searchers.get("google"),
         icecat_searcher=searchers.get("icecat"),
         gs1_searcher=searchers.get("gs1")
     )
-    
-    # Debug info
+
+def show_search_mode(searchers: Dict[str, Any], enabled_sources: List[str]):
+    """Show in the sidebar whether Google search runs against the real API."""
     if "google" in enabled_sources and searchers.get("google"):
         gemini_searcher = searchers.get("google")
         has_api_key = bool(gemini_searcher.api_key)
         st.sidebar.write(f"🔍 Gemini searcher has API key: {has_api_key}")
         if has_api_key:
             st.sidebar.success("🚀 Real-time Google search will be used!")
+
+def key_hash(secret: Optional[str]) -> str:
+    """Stable fingerprint of an API key, used as a cache key instead of the key itself."""
+    return hashlib.blake2b(secret.encode(), digest_size=16).hexdigest() if secret else ""
+
+def is_valid_gemini_key(api_key: Optional[str]) -> bool:
+    """Validate a Gemini API key once per session, re-checking only when the key changes."""
+    if not api_key:
+        return False
+    api_key_hash = key_hash(api_key)
+    if st.session_state.get("gemini_key_hash") != api_key_hash:
+        st.session_state["gemini_key_valid"] = validate_api_key(api_key)
+        st.session_state["gemini_key_hash"] = api_key_hash
+    return st.session_state["gemini_key_valid"]
+
+# Searchers are cached across reruns so their HTTP connection pools survive widget interactions.
+# Arguments prefixed with "_" are excluded from Streamlit's cache key; the key hashes stand in for them.
+@st.cache_resource
+def get_gemini_searcher(api_key_hash: str, _api_key: Optional[str]) -> GeminiProductSearcher:
+    """Gemini searcher shared across reruns for a given API key."""
+    return GeminiProductSearcher(_api_key)
+
+@st.cache_resource
+def get_icecat_searcher(api_key_hash: str, content_token_hash: str,
+                        _api_key: Optional[str], _content_token: Optional[str]) -> IcecatSearcher:
+    """Icecat searcher shared across reruns for a given pair of access tokens."""
+    return IcecatSearcher(api_key=_api_key, content_token=_content_token)
+
+@st.cache_resource
+def get_gs1_searcher() -> GS1Searcher:
+    """GS1 searcher shared across reruns."""
+    return GS1Searcher()
+
+@st.cache_resource
+def get_search_cache() -> SearchCache:
+    """Shared search result cache; survives reruns because it lives outside the script."""
+    return SearchCache()
+
+def search_cache_namespace(searchers: Dict[str, Any], enabled_sources: List[str]) -> str:
+    """Cache namespace for the current sources, tied to the API keys of the configured searchers."""
+    api_keys = [getattr(searchers[name], "api_key", None) for name in sorted(searchers)]
+    return make_namespace(enabled_sources, api_keys)
+
+def search_with_multi_sources(query: str, searchers: Dict[str, Any], enabled_sources: List[str]) -> Dict[str, Any]:
+    """
+    Search for product specifications using multiple sources.
+    Repeated queries are served from the search cache.
+    """
+    show_search_mode(searchers, enabled_sources)
     
-    return multi_searcher.search_product(query, enabled_sources)
+    search_cache = get_search_cache()
+    namespace = search_cache_namespace(searchers, enabled_sources)
+    product_data = search_cache.get(query, namespace)
+    if product_data is None:
+        product_data = build_multi_searcher(searchers).search_product(query, enabled_sources)
+        search_cache.set(query, namespace, product_data)
+    return product_data
+
+async def search_bulk_async(queries: List[str], searchers: Dict[str, Any], enabled_sources: List[str],
+                            on_result: Callable[[int, int, Optional[Dict[str, Any]], Optional[Exception]], None],
+                            max_concurrent: int = 8):
+    """
+    Search all queries concurrently, at most max_concurrent at a time.
+    
+    on_result(completed, index, product_data, error) is called in completion order;
+    index points back into queries so callers can keep the input order. An exception
+    raised by on_result is shown as a warning rather than cancelling the remaining searches.
+    
+    When Gemini is the highest-priority enabled source and has a real key, uncached
+    queries are sent to it GEMINI_BATCH_SIZE at a time; queries the batch could not
+    answer are searched individually. With Icecat enabled, Gemini is only asked when
+    Icecat has no usable result, exactly as in a single search.
+    """
+    multi_searcher = build_multi_searcher(searchers)
+    search_cache = get_search_cache()
+    namespace = search_cache_namespace(searchers, enabled_sources)
+    semaphore = asyncio.Semaphore(max_concurrent)
+    loop = asyncio.get_running_loop()
+    cached = [search_cache.get(query, namespace) for query in queries]
+    
+    # index -> (batch task, position within the batch)
+    batch_slots = {}
+    gemini_searcher = searchers.get("google") if primary_source(enabled_sources) == "google" else None
+    if gemini_searcher is not None and gemini_searcher.api_key:
+        async def fetch_batch(batch_queries: List[str]):
+            async with semaphore:
+                return await loop.run_in_executor(None, gemini_searcher.search_products_batch, batch_queries)
+        
+        uncached = iter([i for i, product_data in enumerate(cached) if product_data is None])
+        for batch in iter(lambda: list(itertools.islice(uncached, GEMINI_BATCH_SIZE)), []):
+            batch_task = asyncio.ensure_future(fetch_batch([queries[i] for i in batch]))
+            for position, index in enumerate(batch):
+                batch_slots[index] = (batch_task, position)
+    
+    async def search_one(index: int, query: str):
+        if cached[index] is not None:
+            return index, cached[index], None
+        
+        prefetched = None
+        if index in batch_slots:
+            batch_task, position = batch_slots[index]
+            try:
+                google_result = (await batch_task)[position]
+            except Exception:
+                google_result = None  # Fall back to an individual Gemini search
+            if google_result is not None:
+                prefetched = {"google": google_result}
+        
+        async with semaphore:
+            try:
+                product_data = await multi_searcher.search_product_async(query, enabled_sources, prefetched)
+            except Exception as e:
+                return index, None, e
+        search_cache.set(query, namespace, product_data)
+        return index, product_data, None
+    
+    tasks = [search_one(i, query) for i, query in enumerate(queries)]
+    for completed, task in enumerate(asyncio.as_completed(tasks), start=1):
+        index, product_data, error = await task
+        try:
+            on_result(completed, index, product_data, error)
+        except Exception as e:
+            st.warning(f"Could not display the result for {queries[index]}: {str(e)}")
 
 def process_bulk_input(bulk_text: str) -> List[str]:
     """Process bulk input text and extract product queries."""
     try:
         # Try to parse as JSON array
-        queries = json.loads(bulk_text)
+        queries = orjson.loads(bulk_text)
         if isinstance(queries, list):
+            if all(type(q) is str for q in queries):
+                return queries
             return [str(q) for q in queries]
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         pass
     
     # Fall back to line-by-line parsing
-    lines = bulk_text.strip().split('\n')
-    return [line.strip() for line in lines if line.strip()]
+    return [line for line in map(str.strip, bulk_text.splitlines()) if line]
+
+def bulk_table(rows: List[Dict[str, str]]) -> "pyarrow.Table":
+    """Build the on-screen bulk results table, with specifications shortened to a preview."""
+    # Imported on first use: pandas adds ~0.2s to cold start and only bulk mode needs it
+    import pandas as pd
+    import pyarrow as pa
+    
+    # Gemini's free-form JSON can mix numbers, strings and lists in one column, which
+    # neither Arrow nor categories accept, so every column is displayed as text
+    df = pd.DataFrame.from_records(rows, columns=BULK_FIELDS).fillna("").astype(str).astype(BULK_DTYPES)
+    specs = df["specifications"]
+    df["specifications"] = specs.where(specs.str.len() <= BULK_SPEC_PREVIEW_CHARS,
+                                       specs.str.slice(0, BULK_SPEC_PREVIEW_CHARS) + "…")
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+def bulk_row(query: str, product_data: Dict[str, Any]) -> Dict[str, str]:
+    """Flatten one search result into a bulk results row."""
+    return {
+        'query': query,
+        'brand': product_data.get('brand', ''),
+        'model': product_data.get('model', ''),
+        'category': product_data.get('category', ''),
+        'price_range': product_data.get('price_range', ''),
+        'availability': product_data.get('availability', ''),
+        'specifications': orjson.dumps(product_data.get('specifications') or {}).decode(),
+        'sources': ', '.join(map(str, product_data.get('sources') or []))
+    }
+
+def bulk_error_row(query: str) -> Dict[str, str]:
+    """Bulk results row for a query whose search failed."""
+    return {'query': query, **dict.fromkeys(BULK_FIELDS[1:], 'Error')}
+
+def read_and_close(file) -> str:
+    """Read a temporary export file from the start, then close it."""
+    try:
+        file.seek(0)
+        return file.read()
+    finally:
+        file.close()
+
+@lru_cache(maxsize=1024)
+def spec_label(key: str) -> str:
+    """HTML-escaped display label for a specification key ("battery_life" -> "Battery Life")."""
+    # Spec keys repeat across products, so bulk renders mostly hit the cache
+    return html.escape(key.replace('_', ' ').title())
 
 def display_product_card(product_data: Dict[str, Any], query: str):
     """Display a product information card."""
@@ -89,29 +288,29 @@ def display_product_card(product_data: Dict[str, Any], query: str):
     is_multi_source = product_data.get('multi_source', False)
     searched_sources = product_data.get('searched_sources', [])
     
-    st.markdown(f"""
-    <div class="product-card">
-        <h3>🔍 Search Query: {query}</h3>
-        <h2>{product_data.get('brand', 'Unknown')} {product_data.get('model', 'Unknown')}</h2>
-        <p><strong>Category:</strong> {product_data.get('category', 'N/A')}</p>
-        <p><strong>Price Range:</strong> {product_data.get('price_range', 'N/A')}</p>
-        <p><strong>Availability:</strong> {product_data.get('availability', 'N/A')}</p>
-        {f'<p><strong>Sources Searched:</strong> {", ".join(searched_sources)}</p>' if is_multi_source else ''}
-    </div>
-    """, unsafe_allow_html=True)
+    # Values come from user input and remote APIs, so escape them before rendering as HTML
+    st.markdown(PRODUCT_CARD_TEMPLATE(
+        query=html.escape(query),
+        brand=html.escape(str(product_data.get('brand', 'Unknown'))),
+        model=html.escape(str(product_data.get('model', 'Unknown'))),
+        category=html.escape(str(product_data.get('category', 'N/A'))),
+        price_range=html.escape(str(product_data.get('price_range', 'N/A'))),
+        availability=html.escape(str(product_data.get('availability', 'N/A'))),
+        searched_sources=SEARCHED_SOURCES_TEMPLATE(html.escape(", ".join(searched_sources))) if is_multi_source else ''
+    ), unsafe_allow_html=True)
     
     # Display specifications
     specs = product_data.get('specifications', {})
     if specs:
         st.subheader("📋 Specifications")
-        cols = st.columns(2)
-        for i, (key, value) in enumerate(specs.items()):
-            with cols[i % 2]:
-                st.markdown(f"""
-                <div class="spec-item">
-                    <strong>{key.replace('_', ' ').title()}:</strong><br>{value}
-                </div>
-                """, unsafe_allow_html=True)
+        spec_items = [
+            SPEC_ITEM_TEMPLATE(key=spec_label(key), value=html.escape(str(value)))
+            for key, value in specs.items()
+        ]
+        # Alternate specs between the columns, rendering each column in a single call
+        left_col, right_col = st.columns(2)
+        left_col.markdown("\n".join(spec_items[0::2]), unsafe_allow_html=True)
+        right_col.markdown("\n".join(spec_items[1::2]), unsafe_allow_html=True)
     
     # Display sources
     sources = product_data.get('sources', [])
@@ -175,8 +374,9 @@ with st.sidebar:
     # Google/Gemini searcher
     if source_google:
         enabled_sources.append("google")
-        use_real_gemini = gemini_api_key and validate_api_key(gemini_api_key)
-        searchers["google"] = GeminiProductSearcher(gemini_api_key if use_real_gemini else None)
+        use_real_gemini = is_valid_gemini_key(gemini_api_key)
+        gemini_key = gemini_api_key if use_real_gemini else None
+        searchers["google"] = get_gemini_searcher(key_hash(gemini_key), gemini_key)
         
         if gemini_api_key and not use_real_gemini:
             st.warning("⚠️ Invalid Gemini API key format")
@@ -188,8 +388,7 @@ with st.sidebar:
             if st.button("🧪 Test Gemini API"):
                 with st.spinner("Testing API connection..."):
                     try:
-                        test_searcher = GeminiProductSearcher(gemini_api_key)
-                        test_result = test_searcher.search_product("iPhone 15", use_demo_mode=False)
+                        test_result = searchers["google"].search_product("iPhone 15", use_demo_mode=False)
                         if test_result.get("brand") != "Unknown":
                             st.success("✅ API test successful! Real data received.")
                         else:
@@ -209,10 +408,9 @@ with st.sidebar:
         except ImportError:
             content_token = None
             
-        searchers["icecat"] = IcecatSearcher(
-            api_key=icecat_api_key if icecat_api_key else None,
-            content_token=content_token
-        )
+        icecat_key = icecat_api_key if icecat_api_key else None
+        searchers["icecat"] = get_icecat_searcher(key_hash(icecat_key), key_hash(content_token),
+                                                  icecat_key, content_token)
         
         if icecat_api_key:
             st.success("✅ Icecat API configured")
@@ -237,7 +435,7 @@ with st.sidebar:
     # GS1 searcher
     if source_gs1:
         enabled_sources.append("gs1")
-        searchers["gs1"] = GS1Searcher()
+        searchers["gs1"] = get_gs1_searcher()
         st.info("ℹ️ GS1 search enabled (works with GTIN codes)")
     
     # Show enabled sources
@@ -246,6 +444,9 @@ with st.sidebar:
     else:
         st.warning("⚠️ No sources selected")
     
+    max_concurrent = st.number_input("Max concurrent requests", 1, 50, 8,
+                                     help="Upper bound on parallel searches during bulk processing (keeps API rate limits happy)")
+    
     st.markdown("---")
     st.markdown("""
     ### 🚀 How It Works
@@ -386,68 +587,87 @@ with tab2:
                     status_text = st.empty()
                     results_container = st.empty()
                     
-                    bulk_results = []
+                    # Results arrive in completion order; slot them back by input index
+                    bulk_results = [None] * len(queries)
+                    preview_rows = deque(maxlen=BULK_PREVIEW_ROWS)
+                    last_progress_update = [0.0]
+                    next_csv_index = [0]
                     
-                    for i, query in enumerate(queries):
-                        status_text.text(f"Processing: {query}")
-                        progress_bar.progress((i + 1) / len(queries))
+                    # Rows are streamed to CSV in input order as soon as all earlier rows are in,
+                    # so the export exists when the loop ends
+                    csv_file = tempfile.TemporaryFile("w+", newline="", encoding="utf-8")
+                    csv_writer = csv.DictWriter(csv_file, fieldnames=BULK_FIELDS, lineterminator="\n")
+                    csv_writer.writeheader()
+                    
+                    def record_result(completed, index, product_data, error):
+                        query = queries[index]
+                        if error is None:
+                            try:
+                                row = bulk_row(query, product_data)
+                            except Exception as e:  # a malformed answer, e.g. non-text sources
+                                error = e
+                        if error is not None:
+                            row = bulk_error_row(query)
+                        
+                        # The row is stored before any widget update, so a failed render can't leave a gap
+                        bulk_results[index] = row
+                        while next_csv_index[0] < len(queries) and bulk_results[next_csv_index[0]] is not None:
+                            csv_writer.writerow(bulk_results[next_csv_index[0]])
+                            next_csv_index[0] += 1
+                        preview_rows.append(row)
                         
-                        try:
-                            product_data = search_with_multi_sources(query, searchers, enabled_sources)
-                            bulk_results.append({
-                                'query': query,
-                                'brand': product_data.get('brand', ''),
-                                'model': product_data.get('model', ''),
-                                'category': product_data.get('category', ''),
-                                'price_range': product_data.get('price_range', ''),
-                                'availability': product_data.get('availability', ''),
-                                'specifications': json.dumps(product_data.get('specifications', {})),
-                                'sources': ', '.join(product_data.get('sources', []))
-                            })
-                        except Exception as e:
-                            st.error(f"Error processing {query}: {str(e)}")
-                            bulk_results.append({
-                                'query': query,
-                                'brand': 'Error',
-                                'model': 'Error',
-                                'category': 'Error',
-                                'price_range': 'Error',
-                                'availability': 'Error',
-                                'specifications': 'Error',
-                                'sources': 'Error'
-                            })
+                        if error is not None:
+                            st.error(f"Error processing {query}: {str(error)}")
+                        # Each widget update is a round-trip to the browser, so throttle them
+                        now = time.monotonic()
+                        if now - last_progress_update[0] >= BULK_PROGRESS_INTERVAL or completed == len(queries):
+                            status_text.text(f"Processed: {query}")
+                            progress_bar.progress(completed / len(queries))
+                            last_progress_update[0] = now
+                        if completed % BULK_PREVIEW_EVERY == 0:
+                            results_container.dataframe(bulk_table(list(preview_rows)),
+                                                        use_container_width=True)
+                    
+                    show_search_mode(searchers, enabled_sources)
+                    asyncio.run(search_bulk_async(queries, searchers, enabled_sources, record_result,
+                                                  max_concurrent=int(max_concurrent)))
                     
                     status_text.text("✅ Processing complete!")
                     
-                    # Display results table
-                    if bulk_results:
-                        df = pd.DataFrame(bulk_results)
-                        st.subheader("📊 Results")
-                        st.dataframe(df, use_container_width=True)
-                        
-                        # Export options
-                        col1, col2, col3 = st.columns(3)
-                        
-                        with col1:
-                            csv = df.to_csv(index=False)
-                            st.download_button(
-                                "📥 Download CSV",
-                                csv,
-                                "product_specs.csv",
-                                "text/csv"
-                            )
-                        
-                        with col2:
-                            json_data = df.to_json(orient='records', indent=2)
-                            st.download_button(
-                                "📥 Download JSON",
-                                json_data,
-                                "product_specs.json",
-                                "application/json"
-                            )
+                    # Prepare both exports in the background while the results table renders
+                    with ThreadPoolExecutor(max_workers=2) as export_executor:
+                        csv_future = export_executor.submit(read_and_close, csv_file)
+                        json_future = export_executor.submit(orjson.dumps, bulk_results,
+                                                             option=orjson.OPT_INDENT_2)
                         
-                        with col3:
-                            st.metric("Products Processed", len(bulk_results))
+                        # Display results table
+                        if bulk_results:
+                            # Replace the live preview with the final table in one render
+                            with results_container.container():
+                                st.subheader("📊 Results")
+                                st.dataframe(bulk_table(bulk_results), use_container_width=True)
+                            
+                            # Export options
+                            col1, col2, col3 = st.columns(3)
+                            
+                            with col1:
+                                st.download_button(
+                                    "📥 Download CSV",
+                                    csv_future.result(),
+                                    "product_specs.csv",
+                                    "text/csv"
+                                )
+                            
+                            with col2:
+                                st.download_button(
+                                    "📥 Download JSON",
+                                    json_future.result(),
+                                    "product_specs.json",
+                                    "application/json"
+                                )
+                            
+                            with col3:
+                                st.metric("Products Processed", len(bulk_results))
             
             except Exception as e:
                 st.error(f"Error processing bulk input: {str(e)}")
@@ -1,10 +1,36 @@
 # Configuration for AI Product Spec Finder
 
+import re
+
 # API Endpoints
 GEMINI_API_ENDPOINT = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
 ICECAT_API_ENDPOINT = "https://live.icecat.biz/api"
 GS1_API_ENDPOINT = "https://api.gs1.org/v1"
 
+# Retry policy for rate-limited (429) and transient server (5xx) responses
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+GEMINI_MAX_RETRIES = 3
+GEMINI_RETRY_BACKOFF = 0.5  # seconds, doubled after each attempt
+GEMINI_CONNECT_TIMEOUT = 5.0  # seconds; fail fast when the host is unreachable
+GEMINI_READ_TIMEOUT = 30.0  # seconds; grounded generation can take a while
+ICECAT_MAX_RETRIES = 3
+ICECAT_RETRY_BACKOFF = 0.3  # seconds, doubled after each attempt
+ICECAT_CONNECT_TIMEOUT = 5.0  # seconds
+ICECAT_READ_TIMEOUT = 25.0  # seconds
+
+# Only the start of an Icecat search page holds the first results; the rest is never read
+ICECAT_MAX_PAGE_BYTES = 256 * 1024
+
+# Per-searcher in-memory cache of Gemini results
+GEMINI_RESULT_CACHE_SIZE = 512
+
+# Search result cache
+SEARCH_CACHE_DIR = ".cache/products"
+SEARCH_CACHE_TTL = 3600  # seconds
+SEARCH_CACHE_MAX_ENTRIES = 1024
+SEARCH_CACHE_MAX_NAMESPACES = 16  # source/API-key configurations kept in the near-match index
+NEAR_MATCH_CUTOFF = 0.92  # difflib similarity needed to reuse a differently spelled query
+
 # Data source configuration
 DATA_SOURCES = {
     "google": {
@@ -52,6 +78,35 @@ Use your web search capabilities to find accurate, up-to-date information from o
 Focus on technical specifications, features, and key product details.
 """
 
+# Batched variant of the search prompt; {queries} is a JSON array of product names
+BATCH_PRODUCT_SEARCH_PROMPT = """
+You are an AI assistant that helps find detailed product specifications by searching the web.
+
+Search for each of the following products: {queries}
+
+Please provide a JSON array with exactly one object per product, in the same order as the list above.
+Each object must use the following format:
+{{
+    "brand": "Brand name",
+    "model": "Model name/number",
+    "category": "Product category",
+    "specifications": {{
+        "spec1": "value1",
+        "spec2": "value2",
+        // Add all relevant technical specifications
+    }},
+    "price_range": "Price range if available",
+    "availability": "Availability status",
+    "sources": ["source1.com", "source2.com"]
+}}
+
+Use your web search capabilities to find accurate, up-to-date information from official websites, retailers, and trusted tech review sites.
+Focus on technical specifications, features, and key product details.
+"""
+
+# Number of products sent to Gemini per batched request in bulk mode
+GEMINI_BATCH_SIZE = 8
+
 # Sample product database for demo purposes
 SAMPLE_PRODUCTS = {
     "iphone 15 pro": {
@@ -189,3 +244,30 @@ SAMPLE_PRODUCTS = {
         "sources": ["apple.com", "soundguys.com", "whatifi.com"]
     }
 }
+
+# Normalized sample lookup: "iPhone-15 Pro", "iphone15pro" and "IPHONE 15 PRO" share one key.
+# Names are normalized as bytes, where translate() deletes characters far faster than on str.
+_SAMPLE_NAME_DROP = b" -_"
+
+
+def normalize_sample_name(name: str) -> bytes:
+    """Lowercase a product name and drop spaces, dashes and underscores."""
+    return name.strip().lower().encode().translate(None, _SAMPLE_NAME_DROP)
+
+
+_NORMALIZED_SAMPLES = {normalize_sample_name(key): product for key, product in SAMPLE_PRODUCTS.items()}
+# Single alternation over all sample names, longest first so "macbookprom3" wins over shorter overlaps
+_SAMPLE_NAME_RE = re.compile(b"|".join(
+    re.escape(name) for name in sorted(_NORMALIZED_SAMPLES, key=len, reverse=True)
+))
+
+
+def lookup_sample(query: str):
+    """Return the sample product named in query (exact or contained), or None."""
+    normalized = normalize_sample_name(query)
+    product = _NORMALIZED_SAMPLES.get(normalized)
+    if product is None:
+        match = _SAMPLE_NAME_RE.search(normalized)
+        if match:
+            product = _NORMALIZED_SAMPLES[match.group()]
+    return product
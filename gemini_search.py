@@ -3,18 +3,173 @@ Gemini AI integration module for product specification search.
 This module handles the interaction with Google's Gemini API.
 """
 
+import asyncio
+import copy
 import json
+import re
+import threading
+import orjson
+from types import MappingProxyType
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 import requests
-from typing import Dict, Any, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
 import streamlit as st
-from config import GEMINI_API_ENDPOINT, PRODUCT_SEARCH_PROMPT, SAMPLE_PRODUCTS
+from config import (GEMINI_API_ENDPOINT, PRODUCT_SEARCH_PROMPT, BATCH_PRODUCT_SEARCH_PROMPT,
+                    SAMPLE_PRODUCTS, lookup_sample,
+                    RETRY_STATUS_CODES, GEMINI_MAX_RETRIES, GEMINI_RETRY_BACKOFF,
+                    GEMINI_CONNECT_TIMEOUT, GEMINI_READ_TIMEOUT, GEMINI_RESULT_CACHE_SIZE, SEARCH_CACHE_TTL)
+from search_cache import TTLCache, normalize_query
+
+# Demo-mode lookup tables, built once from SAMPLE_PRODUCTS instead of on every search.
+# Earlier (catalog order) products win when several share a token, e.g. "pro" or "apple".
+_TOKEN_INDEX = {}
+_SAMPLE_MATCH_DATA = []
+for _key, _product in SAMPLE_PRODUCTS.items():
+    _brand = _product.get('brand', '').lower()
+    _model = _product.get('model', '').lower()
+    for _token in [_key, *(word for word in _key.split() if len(word) > 2), _brand, _model]:
+        _TOKEN_INDEX.setdefault(_token, _product)
+    _SAMPLE_MATCH_DATA.append((_brand, _model, _product))
+
+# Demo-mode "not found" answer; mutable parts are copied per result since callers may extend them
+_NOT_FOUND_SPECIFICATIONS = MappingProxyType({
+    "status": "Product not found in demo database",
+    "suggestion": f"Try one of these available products: {', '.join(SAMPLE_PRODUCTS)}",
+    "search_tip": "Demo mode supports: iPhone 15 Pro, Sony WH-1000XM5, MacBook Pro M3, Dell P2422H, Samsung Galaxy S24, Tesla Model 3, AirPods Pro",
+    "note": "This is demo mode. Connect your Gemini API key for real searches."
+})
+_NOT_FOUND_RESULT = MappingProxyType({
+    "brand": "Unknown",
+    "category": "Product",
+    "price_range": "N/A",
+    "availability": "Unknown",
+})
+
+# (terms, product key): the product is used when any term appears in the query
+_SPECIAL_CASE_RULES = tuple(
+    (terms, key) for terms, key in (
+        (('dell', 'p2422', '2422'), 'dell p2422h'),
+        (('galaxy', 's24', 'samsung'), 'samsung galaxy s24'),
+        (('tesla', 'model 3', 'model3'), 'tesla model 3'),
+        (('airpods', 'pro', 'earbuds'), 'airpods pro'),
+    ) if key in SAMPLE_PRODUCTS
+)
+# All special-case terms in one pattern; the lookahead reports every term occurrence,
+# overlapping ones included, in a single scan of the query
+_SPECIAL_CASE_RULE_BY_TERM = {term: i for i, (terms, _) in enumerate(_SPECIAL_CASE_RULES) for term in terms}
+_SPECIAL_CASE_RE = re.compile("(?=({}))".format("|".join(
+    re.escape(term) for term in sorted(_SPECIAL_CASE_RULE_BY_TERM, key=len, reverse=True)
+)))
+
+def _build_payload(prompt: str, max_output_tokens: int = 2048) -> Dict[str, Any]:
+    """Build a grounded generateContent request for a prompt."""
+    return {
+        "contents": [{
+            "parts": [{
+                "text": prompt
+            }]
+        }],
+        "generationConfig": {
+            "temperature": 0.1,
+            "maxOutputTokens": max_output_tokens,
+        },
+        "tools": [{
+            "googleSearchRetrieval": {
+                "dynamicRetrievalConfig": {
+                    "mode": "MODE_DYNAMIC",
+                    "dynamicThreshold": 0.7
+                }
+            }
+        }]
+    }
+
+# The single-product request body, encoded once and split where the (JSON-escaped) query goes
+_QUERY_SENTINEL = "__PRODUCT_QUERY__"
+_SEARCH_BODY_PREFIX, _SEARCH_BODY_SUFFIX = orjson.dumps(
+    _build_payload(PRODUCT_SEARCH_PROMPT.format(query=_QUERY_SENTINEL))
+).split(_QUERY_SENTINEL.encode())
+
+# Common words that don't help with matching
+_STOPWORDS_RE = re.compile(r"\b(?:monitor|laptop|phone)\b")
+
+@lru_cache(maxsize=1024)
+def _normalize(query: str) -> Tuple[str, Tuple[str, ...]]:
+    """Return the lowercased query and its significant words (stopwords and words under 3 characters dropped)."""
+    query_lower = query.lower().strip()
+    query_words = tuple(word for word in _STOPWORDS_RE.sub(" ", query_lower).split() if len(word) > 2)
+    return query_lower, query_words
+
+_DECODER = json.JSONDecoder()
+_JSON_OPENERS = {dict: "{", list: "["}
+
+def _extract_json(text: str, expected_type: type = dict):
+    """
+    Parse the first JSON object (or array) in model output.
+    
+    Gemini often wraps its answer in ```json fences or adds a sentence around it;
+    raw_decode picks the value out in place instead of stripping the text and re-parsing.
+    Raises ValueError if the text contains no such value.
+    """
+    try:
+        value = orjson.loads(text)
+        if isinstance(value, expected_type):
+            return value
+    except orjson.JSONDecodeError:
+        pass
+    
+    opener = _JSON_OPENERS[expected_type]
+    start = text.find(opener)
+    while start != -1:
+        try:
+            value = _DECODER.raw_decode(text, start)[0]
+            if isinstance(value, expected_type):
+                return value
+        except json.JSONDecodeError:
+            pass
+        start = text.find(opener, start + 1)
+    raise ValueError("No JSON value found in response text")
 
 class GeminiProductSearcher:
     """Handles product specification search using Gemini AI."""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, connect_timeout: float = GEMINI_CONNECT_TIMEOUT,
+                 read_timeout: float = GEMINI_READ_TIMEOUT):
         self.api_key = api_key
         self.endpoint = GEMINI_API_ENDPOINT
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        
+        # Resolve the search mode once: real API searches only with a well-formed key
+        self._has_valid_key = validate_api_key(api_key)
+        self._default_impl = self._real_api_search if self._has_valid_key else self._demo_search
+        
+        # Keep-alive session so bulk searches reuse connections instead of a TLS handshake per query.
+        # Only connection errors and 429/5xx answers are retried: a read timeout means a slow,
+        # already billed generation, so it fails straight away instead of running again
+        retry = Retry(
+            total=GEMINI_MAX_RETRIES,
+            read=False,
+            backoff_factor=GEMINI_RETRY_BACKOFF,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset(["POST"]),
+            raise_on_status=False,
+        )
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry))
+        self._session.headers["Content-Type"] = "application/json"
+        
+        # (normalized query, demo mode) -> result, expiring like the app's search cache
+        self._cache = TTLCache(GEMINI_RESULT_CACHE_SIZE, SEARCH_CACHE_TTL)
+        # (normalized query, demo mode) -> Future of an API search in progress; bulk_search calls in from several threads
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+    
+    def close(self):
+        """Close pooled HTTP connections."""
+        self._session.close()
     
     def search_product(self, query: str, use_demo_mode: bool = None) -> Dict[str, Any]:
         """
@@ -22,215 +177,281 @@ class GeminiProductSearcher:
         
         Args:
             query: Product name/model to search for
-            use_demo_mode: If True, uses sample data. If None, auto-detect based on API key
+            use_demo_mode: If True, uses sample data. Otherwise uses the API when the key is valid
             
         Returns:
             Dictionary containing product specifications
         """
-        # Auto-detect mode based on API key availability
-        if use_demo_mode is None:
-            use_demo_mode = not bool(self.api_key)
+        # Without a valid API key every search runs in demo mode
+        search_impl = self._demo_search if use_demo_mode else self._default_impl
         
-        if use_demo_mode or not self.api_key:
-            return self._demo_search(query)
-        else:
-            return self._real_api_search(query)
+        is_demo = search_impl == self._demo_search
+        cache_key = (normalize_query(query), is_demo)
+        pending = None
+        # The cache is checked under the lock so a search finishing in between is seen either way
+        with self._inflight_lock:
+            cached = self._cache.get(cache_key)
+            if cached is None and not is_demo:
+                # A query already being fetched by another thread is waited for, not requested again
+                pending = self._inflight.get(cache_key)
+                if pending is None:
+                    self._inflight[cache_key] = in_flight = Future()
+        if cached is not None:
+            return cached
+        if pending is not None:
+            # Shared serialized, so every waiter decodes its own copy
+            return orjson.loads(pending.result())
+        
+        try:
+            result = search_impl(query)
+        except BaseException as e:
+            if not is_demo:
+                with self._inflight_lock:
+                    del self._inflight[cache_key]
+                in_flight.set_exception(e)
+            raise
+        
+        # Misses aren't cached so a later fix to the data or the API isn't masked
+        if result and result.get("brand") != "Unknown":
+            self._cache.set(cache_key, result)
+        if not is_demo:
+            with self._inflight_lock:
+                del self._inflight[cache_key]
+            in_flight.set_result(orjson.dumps(result))
+        return result
     
     def _demo_search(self, query: str) -> Dict[str, Any]:
         """Demo mode using sample data with improved matching."""
-        query_lower = query.lower().strip()
+        query_lower, query_words = _normalize(query)
         
-        # Remove common words that don't help with matching
-        query_cleaned = query_lower.replace("monitor", "").replace("laptop", "").replace("phone", "").strip()
+        # Check for exact or contained product names first
+        product = lookup_sample(query_lower)
+        if product is not None:
+            return product
         
-        # Check for exact matches first
-        for key, product in SAMPLE_PRODUCTS.items():
-            if key == query_lower or key in query_lower:
+        # Then for a sample key, brand, model or key word, as the whole query or one of its words
+        product = _TOKEN_INDEX.get(query_lower)
+        if product is not None:
+            return product
+        for query_word in query_words:
+            product = _TOKEN_INDEX.get(query_word)
+            if product is not None:
                 return product
         
         # Check for partial matches with product model/brand
-        for key, product in SAMPLE_PRODUCTS.items():
-            product_brand = product.get('brand', '').lower()
-            product_model = product.get('model', '').lower()
-            
+        # (whole-word matches were already answered by the token index above)
+        for product_brand, product_model, product in _SAMPLE_MATCH_DATA:
             # Check if query contains brand and model parts
             if product_brand in query_lower or product_model in query_lower:
                 return product
-            
-            # Check individual words
-            key_words = key.split()
-            query_words = query_cleaned.split()
-            
-            # If any significant word matches
-            for query_word in query_words:
-                if len(query_word) > 2:  # Skip very short words
-                    for key_word in key_words:
-                        if query_word in key_word or key_word in query_word:
-                            return product
         
         # Special cases for common product searches
-        if any(term in query_lower for term in ['dell', 'p2422', '2422']):
-            if 'dell p2422h' in SAMPLE_PRODUCTS:
-                return SAMPLE_PRODUCTS['dell p2422h']
-        
-        if any(term in query_lower for term in ['galaxy', 's24', 'samsung']):
-            if 'samsung galaxy s24' in SAMPLE_PRODUCTS:
-                return SAMPLE_PRODUCTS['samsung galaxy s24']
-        
-        if any(term in query_lower for term in ['tesla', 'model 3', 'model3']):
-            if 'tesla model 3' in SAMPLE_PRODUCTS:
-                return SAMPLE_PRODUCTS['tesla model 3']
-        
-        if any(term in query_lower for term in ['airpods', 'pro', 'earbuds']):
-            if 'airpods pro' in SAMPLE_PRODUCTS:
-                return SAMPLE_PRODUCTS['airpods pro']
+        matched_rules = {_SPECIAL_CASE_RULE_BY_TERM[match.group(1)] for match in _SPECIAL_CASE_RE.finditer(query_lower)}
+        if matched_rules:
+            # Earlier rules take precedence, as when they were checked one by one
+            return SAMPLE_PRODUCTS[_SPECIAL_CASE_RULES[min(matched_rules)][1]]
         
         # If still no match, show available products
-        available_products = list(SAMPLE_PRODUCTS.keys())
-        return {
-            "brand": "Unknown",
-            "model": query,
-            "category": "Product",
-            "specifications": {
-                "status": "Product not found in demo database",
-                "suggestion": f"Try one of these available products: {', '.join(available_products)}",
-                "search_tip": "Demo mode supports: iPhone 15 Pro, Sony WH-1000XM5, MacBook Pro M3, Dell P2422H, Samsung Galaxy S24, Tesla Model 3, AirPods Pro",
-                "note": "This is demo mode. Connect your Gemini API key for real searches."
-            },
-            "price_range": "N/A",
-            "availability": "Unknown",
-            "sources": ["demo-mode"]
-        }
+        return {**_NOT_FOUND_RESULT, "model": query, "specifications": dict(_NOT_FOUND_SPECIFICATIONS),
+                "sources": ["demo-mode"]}
     
     def _real_api_search(self, query: str) -> Dict[str, Any]:
         """Real API search using Gemini."""
-        if not self.api_key:
-            raise ValueError("API key is required for real searches")
-        
-        prompt = PRODUCT_SEARCH_PROMPT.format(query=query)
-        
-        headers = {
-            "Content-Type": "application/json",
-        }
-        
-        # Add API key to URL
-        api_url = f"{self.endpoint}?key={self.api_key}"
-        
-        payload = {
-            "contents": [{
-                "parts": [{
-                    "text": prompt
-                }]
-            }],
-            "generationConfig": {
-                "temperature": 0.1,
-                "maxOutputTokens": 2048,
-            },
-            "tools": [{
-                "googleSearchRetrieval": {
-                    "dynamicRetrievalConfig": {
-                        "mode": "MODE_DYNAMIC",
-                        "dynamicThreshold": 0.7
-                    }
-                }
-            }]
-        }
+        # Only the query varies between searches, so splice it into the pre-encoded request body
+        body = b"".join((_SEARCH_BODY_PREFIX, orjson.dumps(query)[1:-1], _SEARCH_BODY_SUFFIX))
         
         try:
-            response = requests.post(
-                api_url,
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
+            result = self._generate_content(body)
             
-            if response.status_code == 200:
-                result = response.json()
+            # Extract the generated content
+            if "candidates" in result and len(result["candidates"]) > 0:
+                content = result["candidates"][0]["content"]["parts"][0]["text"]
                 
-                # Extract the generated content
-                if "candidates" in result and len(result["candidates"]) > 0:
-                    content = result["candidates"][0]["content"]["parts"][0]["text"]
+                # Try to parse as JSON
+                try:
+                    product_data = _extract_json(content)
                     
-                    # Try to parse as JSON
-                    try:
-                        product_data = json.loads(content)
-                        
-                        # Add grounding metadata if available
-                        if "groundingMetadata" in result["candidates"][0]:
-                            grounding = result["candidates"][0]["groundingMetadata"]
-                            if "searchEntryPoints" in grounding:
-                                sources = []
-                                for entry in grounding["searchEntryPoints"]:
-                                    if "renderedContent" in entry:
-                                        sources.append(entry["renderedContent"])
-                                product_data["sources"] = sources
-                        
-                        return product_data
+                    # Prefer the pages Google Search grounded the answer on over the model's own source list
+                    grounding = result["candidates"][0].get("groundingMetadata") or {}
+                    sources = [chunk["web"]["uri"] for chunk in grounding.get("groundingChunks") or ()
+                               if "uri" in chunk.get("web", ())]
+                    if sources:
+                        product_data["sources"] = sources
                     
-                    except json.JSONDecodeError:
-                        # If not valid JSON, return raw content
-                        return {
-                            "brand": "Unknown",
-                            "model": query,
-                            "category": "Product",
-                            "specifications": {"raw_response": content},
-                            "price_range": "N/A",
-                            "availability": "Unknown",
-                            "sources": ["gemini-api"]
-                        }
+                    return product_data
                 
-            else:
-                raise Exception(f"API request failed: {response.status_code} - {response.text}")
+                except ValueError:
+                    # If no JSON object in the text, return raw content
+                    return {
+                        "brand": "Unknown",
+                        "model": query,
+                        "category": "Product",
+                        "specifications": {"raw_response": content},
+                        "price_range": "N/A",
+                        "availability": "Unknown",
+                        "sources": ["gemini-api"]
+                    }
                 
         except requests.exceptions.RequestException as e:
             raise Exception(f"Network error: {str(e)}")
         except Exception as e:
             raise Exception(f"API error: {str(e)}")
     
+    def search_products_batch(self, queries: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Search several products with a single Gemini request.
+        
+        Args:
+            queries: Product names/models to search for
+            
+        Returns:
+            One entry per query, in order. An entry is None when the batched answer
+            could not be used for that query; callers should search it individually.
+        """
+        if not self._has_valid_key:
+            return [self._demo_search(query) for query in queries]
+        
+        prompt = BATCH_PRODUCT_SEARCH_PROMPT.format(queries=orjson.dumps(queries).decode())
+        try:
+            # Room for one full answer per product, within gemini-1.5-flash's 8192 token output limit
+            result = self._generate_content(orjson.dumps(_build_payload(prompt, min(2048 * len(queries), 8192))))
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"Network error: {str(e)}")
+        
+        try:
+            content = result["candidates"][0]["content"]["parts"][0]["text"]
+            products = _extract_json(content, list)
+        except (KeyError, IndexError, TypeError, ValueError):
+            return [None] * len(queries)
+        
+        # Answers can only be matched back to queries if the model kept one entry per product
+        if not isinstance(products, list) or len(products) != len(queries):
+            return [None] * len(queries)
+        return [product if isinstance(product, dict) else None for product in products]
+    
+    def _generate_content(self, body: bytes) -> Dict[str, Any]:
+        """Send an encoded generateContent request body to the Gemini API and return the decoded response."""
+        # Add API key to URL
+        api_url = f"{self.endpoint}?key={self.api_key}"
+        
+        # Rate-limited/transient failures are retried with exponential backoff by the session's adapter
+        response = self._session.post(api_url, data=body, timeout=(self.connect_timeout, self.read_timeout))
+        
+        if response.status_code != 200:
+            raise Exception(f"API request failed: {response.status_code} - {response.text}")
+        return orjson.loads(response.content)
+    
     def bulk_search(self, queries: list, use_demo_mode: bool = True, 
-                   progress_callback=None) -> list:
+                   progress_callback=None, max_workers: int = 8) -> list:
         """
         Perform bulk product searches.
         
         Args:
             queries: List of product queries
             use_demo_mode: Whether to use demo mode
-            progress_callback: Optional callback for progress updates
+            progress_callback: Optional callback for progress updates, called as each search completes
+            max_workers: Maximum number of searches running at once
             
         Returns:
-            List of product data dictionaries
+            List of product data dictionaries, in the same order as queries.
+            Repeated queries (ignoring case and surrounding whitespace) are only searched once.
         """
-        results = []
+        unique_queries = _unique_queries(queries)
+        outcomes = {}
         
-        for i, query in enumerate(queries):
-            try:
+        # Searches are I/O-bound, so threads sharing the pooled session overlap the network waits
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self.search_product, query, use_demo_mode): key
+                for key, query in unique_queries.items()
+            }
+            
+            for done, future in enumerate(as_completed(futures), start=1):
+                key = futures[future]
                 if progress_callback:
-                    progress_callback(i + 1, len(queries), query)
-                
-                result = self.search_product(query, use_demo_mode)
-                results.append({
-                    "query": query,
-                    "success": True,
-                    "data": result
-                })
+                    progress_callback(done, len(futures), unique_queries[key])
                 
-            except Exception as e:
-                results.append({
-                    "query": query,
-                    "success": False,
-                    "error": str(e),
-                    "data": {
-                        "brand": "Error",
-                        "model": query,
-                        "category": "Error",
-                        "specifications": {"error": str(e)},
-                        "price_range": "N/A",
-                        "availability": "Error",
-                        "sources": ["error"]
-                    }
-                })
+                try:
+                    outcomes[key] = future.result()
+                except Exception as e:
+                    outcomes[key] = e
+        
+        return _bulk_results(queries, outcomes)
+    
+    async def search_product_async(self, query: str, use_demo_mode: bool = None) -> Dict[str, Any]:
+        """Async variant of search_product; runs the blocking search in a worker thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.search_product, query, use_demo_mode)
+    
+    async def bulk_search_async(self, queries: list, use_demo_mode: bool = True,
+                                max_concurrent: int = 8) -> list:
+        """
+        Async variant of bulk_search for callers already running an event loop.
+        
+        Args:
+            queries: List of product queries
+            use_demo_mode: Whether to use demo mode
+            max_concurrent: Maximum number of searches running at once
+            
+        Returns:
+            List of product data dictionaries, in the same order as queries
+        """
+        semaphore = asyncio.Semaphore(max_concurrent)
+        
+        async def search_one(query: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.search_product_async(query, use_demo_mode)
         
-        return results
+        unique_queries = _unique_queries(queries)
+        outcomes = await asyncio.gather(*(search_one(query) for query in unique_queries.values()),
+                                        return_exceptions=True)
+        return _bulk_results(queries, dict(zip(unique_queries, outcomes)))
+
+def _unique_queries(queries: list) -> Dict[str, str]:
+    """Map each distinct normalized query to its first spelling, so repeats are searched once."""
+    unique_queries = {}
+    for query in queries:
+        unique_queries.setdefault(normalize_query(query), query)
+    return unique_queries
+
+def _bulk_results(queries: list, outcomes: Dict[str, Any]) -> list:
+    """Fan per-unique-query outcomes (results or exceptions) back out to every input query."""
+    results = []
+    seen = set()
+    for query in queries:
+        key = normalize_query(query)
+        outcome = outcomes[key]
+        if isinstance(outcome, Exception):
+            results.append(_bulk_result(query, error=outcome))
+        else:
+            # Repeats get their own copy so callers can modify results independently
+            results.append(_bulk_result(query, copy.deepcopy(outcome) if key in seen else outcome))
+        seen.add(key)
+    return results
+
+def _bulk_result(query: str, data: Optional[Dict[str, Any]] = None,
+                 error: Optional[Exception] = None) -> Dict[str, Any]:
+    """Wrap one bulk search outcome in the shape bulk_search returns."""
+    if error is None:
+        return {
+            "query": query,
+            "success": True,
+            "data": data
+        }
+    return {
+        "query": query,
+        "success": False,
+        "error": str(error),
+        "data": {
+            "brand": "Error",
+            "model": query,
+            "category": "Error",
+            "specifications": {"error": str(error)},
+            "price_range": "N/A",
+            "availability": "Error",
+            "sources": ["error"]
+        }
+    }
 
 # Utility functions
 def validate_api_key(api_key: str) -> bool:
@@ -1,44 +1,422 @@
 """
 Multi-source data integration module.
 Handles connections to Google/Gemini, Icecat, and GS1 APIs.
+
+Inside the Streamlit app, get searchers from the st.cache_resource factories in
+app.py (get_icecat_searcher, get_gs1_searcher, ...) rather than constructing them,
+so their caches survive reruns.
 """
 
+import asyncio
 import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from urllib.parse import quote_plus
+from types import MappingProxyType
 import requests
-from typing import Dict, Any, Optional, List
+from lxml import etree, html as lxml_html
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Any, Optional, List, NamedTuple, Tuple
 import streamlit as st
-from config import ICECAT_API_ENDPOINT, GS1_API_ENDPOINT
+from config import (ICECAT_API_ENDPOINT, GS1_API_ENDPOINT, ICECAT_MAX_PAGE_BYTES, RETRY_STATUS_CODES,
+                    ICECAT_MAX_RETRIES, ICECAT_RETRY_BACKOFF, ICECAT_CONNECT_TIMEOUT, ICECAT_READ_TIMEOUT)
+from search_cache import TTLCache
+
+# Icecat search page scraping: headings, then title and alt texts, naming a known product line
+_PRODUCT_NAME_XPATHS = tuple(etree.XPath(xpath) for xpath in (
+    "//*[self::h1 or self::h2 or self::h3][not(*)]/text()",
+    "//@title",
+    "//@alt",
+))
+_PRODUCT_LINES = r'(?:Galaxy|iPhone|Dell|Sony|MacBook)'
+_PRODUCT_NAME_RE = re.compile(r'.' + _PRODUCT_LINES, re.IGNORECASE | re.DOTALL)
+# Cheap reject filter: a page that never mentions a product line can't yield a name, so it isn't parsed
+_PRODUCT_LINE_RE = re.compile(_PRODUCT_LINES, re.IGNORECASE)
+_SPEC_PATTERNS = {
+    spec_name: re.compile(pattern, re.IGNORECASE) for spec_name, pattern in {
+        "display": r'(\d+\.?\d*)\s*(?:inch|")\s*([^<,]*)',
+        "storage": r'(\d+(?:GB|TB))',
+        "memory": r'(\d+(?:GB|MB))\s*(?:RAM|Memory)',
+        "processor": r'(A\d+|Intel|AMD|Snapdragon)[^<,]*',
+        "camera": r'(\d+MP)',
+    }.items()
+}
+_GALAXY_S24_RE = re.compile(r'Samsung Galaxy S24[^<]*', re.IGNORECASE)
+_GALAXY_MODEL_CODE_RE = re.compile(r'SM-S92[0-9A-Z]+')
+
+# Brands recognised in free-text queries, in order of precedence
+KNOWN_BRANDS = (
+    'Samsung', 'Apple', 'Dell', 'Sony', 'HP', 'Lenovo', 'LG', 'Asus',
+    'Acer', 'Gembird', 'Intel', 'AMD', 'NVIDIA', 'Microsoft', 'Google',
+    'Xiaomi', 'Huawei', 'OnePlus', 'Motorola', 'Nokia', 'Panasonic',
+    'Canon', 'Nikon', 'Epson', 'Brother', 'Cisco', 'Netgear', 'TP-Link'
+)
+_KNOWN_BRANDS_LOWER = tuple(brand.lower() for brand in KNOWN_BRANDS)
+_BRAND_RANKS = {brand: rank for rank, brand in enumerate(_KNOWN_BRANDS_LOWER)}
+# Brands looked for in product names scraped from Icecat pages: the leading known brands
+_PRODUCT_NAME_BRANDS = tuple(zip(_KNOWN_BRANDS_LOWER[:6], KNOWN_BRANDS[:6]))
+
+# Category keywords, in order of precedence
+PRODUCT_CATEGORIES = (
+    ("Smartphone", ('phone', 'iphone', 'galaxy', 'smartphone', 'mobile', 'android')),
+    ("Monitor", ('monitor', 'display', 'screen', 'lcd', 'led', 'oled')),
+    ("Laptop", ('laptop', 'macbook', 'notebook', 'ultrabook', 'thinkpad')),
+    ("Audio", ('headphone', 'earphone', 'airpods', 'speaker', 'soundbar')),
+    ("Power Supply", ('ups', 'power', 'supply', 'battery', 'charger')),
+    ("Networking", ('router', 'switch', 'wifi', 'modem', 'access point')),
+    ("Storage", ('ssd', 'hdd', 'drive', 'storage', 'disk')),
+    ("Gaming", ('gaming', 'xbox', 'playstation', 'console', 'gamepad')),
+    ("Camera", ('camera', 'webcam', 'lens', 'camcorder')),
+    ("Printer", ('printer', 'scanner', 'multifunction', 'inkjet', 'laser')),
+)
+_CATEGORY_RANKS = {}
+for _rank, (_, _keywords) in enumerate(PRODUCT_CATEGORIES):
+    for _keyword in _keywords:
+        _CATEGORY_RANKS.setdefault(_keyword, _rank)
+# One scan finds every keyword occurrence; the lookahead lets overlapping keywords all match
+_CATEGORY_KEYWORD_RE = re.compile("(?=({}))".format("|".join(
+    re.escape(keyword) for keyword in sorted(_CATEGORY_RANKS, key=len, reverse=True)
+)))
+
+# Sample Icecat-style products for demo searches, in order of precedence; the
+# per-query source_url is added to a copy of the specifications when a product is returned
+_ICECAT_DEMO_PRODUCTS = {
+    "samsung_galaxy_s24": {
+        "triggers": ['samsung', 'galaxy', 's24'],
+        "data": {
+            "brand": "Samsung",
+            "model": "Galaxy S24 15.8 cm (6.2\") Dual SIM Android 14 5G USB Type-C 8 GB 128 GB 4000 mAh Amber, Yellow",
+            "category": "Smartphone",
+            "specifications": {
+                "icecat_id": "SM-S921BZYDEUBH",
+                "display": "15.8 cm (6.2\") Dynamic AMOLED 2X",
+                "storage": "128GB internal storage",
+                "ram": "8 GB",
+                "main_camera": "50 MP main camera",
+                "battery": "4000 mAh",
+                "connectivity": "5G, USB Type-C",
+                "os": "Android 14",
+                "sim": "Dual SIM",
+                "colors": "Amber, Yellow",
+                "dimensions": "147.0 x 70.6 x 7.6 mm",
+                "search_results": "Product found in Icecat database"
+            },
+            "price_range": "Contact supplier",
+            "availability": "Available in Icecat catalog",
+            "sources": ["icecat.biz"]
+        }
+    },
+    "dell_monitor": {
+        "triggers": ['dell', 'p2422', 'monitor'],
+        "data": {
+            "brand": "Dell",
+            "model": "P2422H 24-inch Professional Monitor",
+            "category": "LCD Monitor",
+            "specifications": {
+                "icecat_id": "210-AYLX",
+                "screen_size": "24 inches (60.96 cm)",
+                "resolution": "1920 x 1080 Full HD",
+                "panel_type": "IPS",
+                "response_time": "5 ms",
+                "refresh_rate": "60 Hz",
+                "connectivity": "HDMI, DisplayPort, VGA, USB hub",
+                "energy_rating": "Energy Star certified",
+                "vesa_mount": "100 x 100 mm",
+                "adjustable_stand": "Height, tilt, swivel, pivot",
+                "color_coverage": "99% sRGB",
+                "search_results": "Product found in Icecat database"
+            },
+            "price_range": "$200 - $280",
+            "availability": "Available in Icecat catalog",
+            "sources": ["icecat.biz"]
+        }
+    },
+    "gembird_ups": {
+        "triggers": ['gembird', 'ups', '850'],
+        "data": {
+            "brand": "Gembird",
+            "model": "UPS-PC-850AP",
+            "category": "UPS (Uninterruptible Power Supply)",
+            "specifications": {
+                "icecat_id": "UPS-PC-850AP",
+                "power_capacity": "850 VA / 480 W",
+                "battery_type": "Sealed Lead Acid",
+                "backup_time": "10-15 minutes at full load",
+                "input_voltage": "230V AC ±25%",
+                "output_voltage": "230V AC ±10%",
+                "outlets": "4 x IEC 13A sockets",
+                "protection": "Surge, overload, short circuit",
+                "dimensions": "350 x 95 x 140 mm",
+                "weight": "4.5 kg",
+                "search_results": "Product found in Icecat database"
+            },
+            "price_range": "$80 - $120",
+            "availability": "Available in Icecat catalog",
+            "sources": ["icecat.biz"]
+        }
+    },
+    "iphone": {
+        "triggers": ['iphone', 'apple', '15', 'pro'],
+        "data": {
+            "brand": "Apple",
+            "model": "iPhone 15 Pro",
+            "category": "Smartphone",
+            "specifications": {
+                "icecat_id": "iPhone15Pro",
+                "display": "6.1-inch Super Retina XDR OLED",
+                "processor": "A17 Pro chip",
+                "storage": "128GB, 256GB, 512GB, 1TB",
+                "camera": "48MP main, 12MP ultra-wide, 12MP telephoto",
+                "battery": "Up to 23 hours video playback",
+                "connectivity": "5G, Wi-Fi 6E, Bluetooth 5.3",
+                "materials": "Titanium design",
+                "search_results": "Product found in Icecat database"
+            },
+            "price_range": "$999 - $1,499",
+            "availability": "Available in Icecat catalog",
+            "sources": ["icecat.biz"]
+        }
+    }
+}
+
+# Products the simple Icecat live search recognises, based on real Icecat data
+_ICECAT_KNOWN_PRODUCTS = {
+    "samsung_galaxy_s24": {
+        "triggers": ["samsung", "galaxy", "s24"],
+        "data": {
+            "brand": "Samsung",
+            "model": "Galaxy S24 15.8 cm (6.2\") Dual SIM Android 14",
+            "category": "Smartphone",
+            "specifications": {
+                "model_code": "SM-S921BZYDEUBH",
+                "display": "15.8 cm (6.2\"), 8 GB, 128 GB, 50 MP, Android 14",
+                "memory": "8 GB RAM, 128GB storage",
+                "camera": "50MP main camera",
+                "connectivity": "Dual SIM, 5G",
+                "os": "Android 14",
+                "color": "Amber, Yellow"
+            },
+            "price_range": "Contact supplier",
+            "availability": "Available",
+            "sources": ["icecat.biz"]
+        }
+    },
+    "dell_monitor": {
+        "triggers": ["dell", "p2422", "monitor"],
+        "data": {
+            "brand": "Dell",
+            "model": "P2422H",
+            "category": "LCD Monitor",
+            "specifications": {
+                "screen_size": "24 inches",
+                "resolution": "1920 x 1080",
+                "panel_type": "IPS",
+                "refresh_rate": "60 Hz",
+                "connectivity": "HDMI, DisplayPort, VGA, USB"
+            },
+            "price_range": "$200 - $280",
+            "availability": "In Stock",
+            "sources": ["icecat.biz"]
+        }
+    }
+}
+
+# Standard "not found" and error answers; None marks the per-query fields, kept to fix the key order
+_NO_RESULTS_TEMPLATE = MappingProxyType({
+    "brand": "Not Found",
+    "model": None,
+    "category": "Unknown",
+    "specifications": None,
+    "price_range": "N/A",
+    "availability": "Unknown",
+    "sources": None
+})
+_NO_RESULTS_SUGGESTION = "Try a different search term or check spelling"
+_ERROR_TEMPLATE = MappingProxyType({
+    "brand": "Error",
+    "model": None,
+    "category": "Error",
+    "specifications": None,
+    "price_range": "N/A",
+    "availability": "Error",
+    "sources": None
+})
+
+def _freeze_products(products: Dict[str, Dict[str, Any]]):
+    """Turn each product's data into a read-only template, shared by every search."""
+    for product_info in products.values():
+        data = product_info["data"]
+        product_info["data"] = MappingProxyType(dict(
+            data, specifications=MappingProxyType(data["specifications"]), sources=tuple(data["sources"])
+        ))
+
+def _product_from_template(data: Dict[str, Any], **extra_specifications: str) -> Dict[str, Any]:
+    """Build a fresh result, safe for callers to change, from a read-only product template."""
+    specifications = dict(data["specifications"], **extra_specifications)
+    return dict(data, specifications=specifications, sources=list(data["sources"]))
+
+_freeze_products(_ICECAT_DEMO_PRODUCTS)
+_freeze_products(_ICECAT_KNOWN_PRODUCTS)
+
+# Inverted index from trigger to the demo products it names, and each product's full trigger set
+_ICECAT_TRIGGER_INDEX = {}
+for _product_key, _product_info in _ICECAT_DEMO_PRODUCTS.items():
+    for _trigger in _product_info["triggers"]:
+        _ICECAT_TRIGGER_INDEX.setdefault(_trigger, set()).add(_product_key)
+_ICECAT_PRODUCT_ORDER = {product_key: rank for rank, product_key in enumerate(_ICECAT_DEMO_PRODUCTS)}
+_ICECAT_PRODUCT_TRIGGERS = {
+    product_key: frozenset(product_info["triggers"])
+    for product_key, product_info in _ICECAT_DEMO_PRODUCTS.items()
+}
+# Triggers match anywhere in the query ("iphone15pro"); the lookahead finds overlapping ones too
+_ICECAT_TRIGGER_RE = re.compile("(?=({}))".format("|".join(
+    re.escape(trigger) for trigger in sorted(_ICECAT_TRIGGER_INDEX, key=len, reverse=True)
+)))
+
+# GTIN-8, GTIN-12 (UPC), GTIN-13 (EAN) and GTIN-14, with "-" and " " separators allowed
+_GTIN_LENGTHS = frozenset((8, 12, 13, 14))
+_GTIN_SEPARATORS = str.maketrans("", "", "- ")
+
+# Answer for GS1 queries that aren't GTINs; None marks the per-query fields, kept to fix the key order
+_GS1_INVALID_GTIN_SPECIFICATIONS = MappingProxyType({
+    "note": "GS1 search works best with GTIN/barcode numbers",
+    "gtin_format": "Enter 8, 12, 13, or 14 digit GTIN",
+    "example": "Try: 012345678905 or 1234567890123",
+    "status": "Invalid GTIN format"
+})
+_GS1_INVALID_GTIN_TEMPLATE = MappingProxyType({
+    "brand": "GS1 Search",
+    "model": None,
+    "category": "Product Identification",
+    "specifications": None,
+    "price_range": "N/A",
+    "availability": "Unknown",
+    "sources": None
+})
+
+@lru_cache(maxsize=1024)
+def _match_icecat_demo(query_lower: str) -> Optional[str]:
+    """Key of the demo product a lowercased query names, or None; memoized since reruns repeat queries."""
+    matched_triggers = {match.group(1) for match in _ICECAT_TRIGGER_RE.finditer(query_lower)}
+    candidates = set().union(*(_ICECAT_TRIGGER_INDEX[trigger] for trigger in matched_triggers))
+    if not candidates:
+        return None
+    # Priority matching: a product whose triggers all match, else any product with a matching trigger
+    exact = [key for key in candidates if _ICECAT_PRODUCT_TRIGGERS[key] <= matched_triggers]
+    return min(exact or candidates, key=_ICECAT_PRODUCT_ORDER.__getitem__)
+
+# Sample GTINs for GS1 demo searches
+_GS1_SAMPLE_GTINS = MappingProxyType({
+    "012345678905": {
+        "brand": "Sample Brand",
+        "product_name": "Demo Product",
+        "category": "Consumer Goods"
+    },
+    "1234567890123": {
+        "brand": "Tech Corp",
+        "product_name": "Electronic Device",
+        "category": "Electronics"
+    }
+})
+
+ICECAT_SEARCH_URL = "https://icecat.biz/en/search/?keyword="
+
+class _QueryContext(NamedTuple):
+    """A query and the forms of it the Icecat helpers read, derived once per search."""
+    raw: str
+    lower: str
+    words: Tuple[str, ...]  # lowercased, whitespace-split
+    search_url: str
+
+def _query_context(query: str) -> _QueryContext:
+    query_lower = query.lower()
+    return _QueryContext(query, query_lower, tuple(query_lower.split()),
+                         ICECAT_SEARCH_URL + quote_plus(query))
+
+def _first_product_name(html_content: str) -> Optional[str]:
+    """Find the first product name on an Icecat search page, parsing the page once."""
+    if not _PRODUCT_LINE_RE.search(html_content):
+        return None
+    try:
+        tree = lxml_html.fromstring(html_content)
+    except etree.ParserError:  # empty page
+        return None
+    for xpath in _PRODUCT_NAME_XPATHS:
+        for text in xpath(tree):
+            if _PRODUCT_NAME_RE.search(text):
+                return text.strip()
+    return None
+
+BROWSER_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+@lru_cache(maxsize=None)
+def _icecat_session() -> requests.Session:
+    """Session shared by all Icecat searchers, built on the first live fetch and kept alive between queries."""
+    # Idempotent GETs are retried on connection errors and rate-limit/5xx answers rather than failing the search
+    retry = Retry(
+        total=ICECAT_MAX_RETRIES,
+        connect=2,
+        read=2,
+        status=2,
+        backoff_factor=ICECAT_RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(["GET"]),
+        raise_on_status=False,
+    )
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry))
+    session.headers["User-Agent"] = BROWSER_USER_AGENT
+    return session
 
 class IcecatSearcher:
     """Handles product specification search using Icecat API."""
     
+    __slots__ = ("api_key", "content_token", "endpoint", "_cache")
+    
     def __init__(self, api_key: Optional[str] = None, content_token: Optional[str] = None):
         self.api_key = api_key  # API Access Token
         self.content_token = content_token  # Content Access Token
         self.endpoint = ICECAT_API_ENDPOINT
+        self._cache = TTLCache()  # normalized query -> result
     
     def search_product(self, query: str) -> Dict[str, Any]:
         """Search for product in Icecat database."""
+        ctx = _query_context(query)
+        cache_key = " ".join(ctx.words)  # normalize_query, from the already split words
+        result = self._cache.get(cache_key)
+        if result is not None:
+            return result
+        
         # Always return first result from enhanced demo database
         # This ensures we get consistent results instead of "Not Found"
-        return self._demo_icecat_search(query)
+        result = self._demo_icecat_search(ctx)
+        
+        # Failed lookups are retried next time rather than cached
+        if result.get("brand") not in ("Not Found", "Error"):
+            self._cache.set(cache_key, result)
+        return result
+    
+    async def search_product_async(self, query: str) -> Dict[str, Any]:
+        """Async variant of search_product; the cache and demo lookups never block, so it runs on the event loop."""
+        return self.search_product(query)
     
     def _try_icecat_open_catalog(self, query: str) -> Dict[str, Any]:
         """Try Icecat Open Catalog API with web scraping approach."""
         try:
             # Use Icecat search URL similar to the attachment
-            search_url = f"https://icecat.biz/en/search/?keyword={query.replace(' ', '%20')}"
+            ctx = _query_context(query)
             
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            
-            response = requests.get(search_url, headers=headers, timeout=30)
+            # Streamed so at most ICECAT_MAX_PAGE_BYTES of the page is downloaded and decoded
+            with _icecat_session().get(ctx.search_url, timeout=(ICECAT_CONNECT_TIMEOUT, ICECAT_READ_TIMEOUT),
+                                       stream=True) as response:
+                if response.status_code != 200:
+                    return self._error_response(query, f"Search page: {response.status_code}", "Icecat")
+                page = response.raw.read(ICECAT_MAX_PAGE_BYTES, decode_content=True)
+                html_content = page.decode(response.encoding or "utf-8", errors="replace")
             
-            if response.status_code == 200:
-                return self._parse_icecat_search_page(response.text, query)
-            else:
-                return self._error_response(query, f"Search page: {response.status_code}", "Icecat")
+            return self._parse_icecat_search_page(html_content, ctx)
                 
         except Exception as e:
             return self._error_response(query, f"Search error: {str(e)}", "Icecat")
@@ -51,90 +429,35 @@ class IcecatSearcher:
             
             query_lower = query.lower()
             
-            # Enhanced product database based on real Icecat data
-            known_products = {
-                "samsung_galaxy_s24": {
-                    "triggers": ["samsung", "galaxy", "s24"],
-                    "data": {
-                        "brand": "Samsung",
-                        "model": "Galaxy S24 15.8 cm (6.2\") Dual SIM Android 14",
-                        "category": "Smartphone",
-                        "specifications": {
-                            "model_code": "SM-S921BZYDEUBH",
-                            "display": "15.8 cm (6.2\"), 8 GB, 128 GB, 50 MP, Android 14",
-                            "memory": "8 GB RAM, 128GB storage",
-                            "camera": "50MP main camera",
-                            "connectivity": "Dual SIM, 5G",
-                            "os": "Android 14",
-                            "color": "Amber, Yellow"
-                        },
-                        "price_range": "Contact supplier",
-                        "availability": "Available",
-                        "sources": ["icecat.biz"]
-                    }
-                },
-                "dell_monitor": {
-                    "triggers": ["dell", "p2422", "monitor"],
-                    "data": {
-                        "brand": "Dell",
-                        "model": "P2422H",
-                        "category": "LCD Monitor",
-                        "specifications": {
-                            "screen_size": "24 inches",
-                            "resolution": "1920 x 1080",
-                            "panel_type": "IPS",
-                            "refresh_rate": "60 Hz",
-                            "connectivity": "HDMI, DisplayPort, VGA, USB"
-                        },
-                        "price_range": "$200 - $280",
-                        "availability": "In Stock",
-                        "sources": ["icecat.biz"]
-                    }
-                }
-            }
-            
             # Check for matches
-            for product_key, product_info in known_products.items():
+            for product_info in _ICECAT_KNOWN_PRODUCTS.values():
                 if all(trigger in query_lower for trigger in product_info["triggers"]):
-                    return product_info["data"]
+                    return _product_from_template(product_info["data"])
             
             # If no exact match, try partial matches
-            for product_key, product_info in known_products.items():
+            for product_info in _ICECAT_KNOWN_PRODUCTS.values():
                 if any(trigger in query_lower for trigger in product_info["triggers"]):
-                    result = product_info["data"].copy()
-                    result["specifications"]["note"] = "Partial match - verify details on icecat.biz"
-                    return result
+                    return _product_from_template(product_info["data"],
+                                                  note="Partial match - verify details on icecat.biz")
             
             return self._no_results_found(query, "Icecat Live API")
                 
         except Exception as e:
             return self._error_response(query, f"Live API error: {str(e)}", "Icecat")
     
-    def _parse_icecat_search_page(self, html_content: str, query: str) -> Dict[str, Any]:
+    def _parse_icecat_search_page(self, html_content: str, ctx: _QueryContext) -> Dict[str, Any]:
         """Parse Icecat search page HTML to extract first product result."""
+        query = ctx.raw
         try:
-            import re
-            
-            # Look for product data in the HTML
-            # Search for product cards with Samsung Galaxy S24 pattern from attachment
-            product_pattern = r'<div[^>]*class="[^"]*product[^"]*"[^>]*>.*?</div>'
-            
-            # Try to find product name patterns
-            name_patterns = [
-                r'<h[123][^>]*>([^<]+(?:Galaxy|iPhone|Dell|Sony|MacBook)[^<]*)</h[123]>',
-                r'title="([^"]+(?:Galaxy|iPhone|Dell|Sony|MacBook)[^"]*)"',
-                r'alt="([^"]+(?:Galaxy|iPhone|Dell|Sony|MacBook)[^"]*)"'
-            ]
-            
             # Look for Samsung Galaxy S24 specifically based on attachment
-            if 'galaxy' in query.lower() and 's24' in query.lower():
+            if 'galaxy' in ctx.lower and 's24' in ctx.lower:
                 # Extract Samsung Galaxy S24 info based on attachment pattern
-                galaxy_match = re.search(r'Samsung Galaxy S24[^<]*', html_content, re.IGNORECASE)
+                galaxy_match = _GALAXY_S24_RE.search(html_content)
                 if galaxy_match:
                     product_name = galaxy_match.group(0)
                     
                     # Extract model info
-                    model_match = re.search(r'SM-S92[0-9A-Z]+', html_content)
+                    model_match = _GALAXY_MODEL_CODE_RE.search(html_content)
                     model_code = model_match.group(0) if model_match else "SM-S921BZYDEUBH"
                     
                     # Extract specifications from the page
@@ -150,7 +473,7 @@ class IcecatSearcher:
                             "storage": "128GB, 256GB, 512GB",
                             "camera": "50MP main + 12MP ultra-wide + 10MP telephoto",
                             "connectivity": "5G, Wi-Fi 6E, Bluetooth 5.3",
-                            "source_url": f"https://icecat.biz/en/search/?keyword={query.replace(' ', '%20')}"
+                            "source_url": ctx.search_url
                         },
                         "price_range": "Contact supplier",
                         "availability": "Check with retailer",
@@ -158,37 +481,34 @@ class IcecatSearcher:
                     }
             
             # Generic product extraction for other products
-            for pattern in name_patterns:
-                matches = re.findall(pattern, html_content, re.IGNORECASE)
-                if matches:
-                    product_name = matches[0].strip()
-                    
-                    # Try to extract brand from product name
-                    brand = "Unknown"
-                    if any(b in product_name.lower() for b in ['samsung', 'apple', 'dell', 'sony', 'hp', 'lenovo']):
-                        brand = next(b.title() for b in ['samsung', 'apple', 'dell', 'sony', 'hp', 'lenovo'] 
-                                   if b in product_name.lower())
-                    
-                    return {
-                        "brand": brand,
-                        "model": product_name,
-                        "category": self._guess_category(product_name),
-                        "specifications": self._extract_specs_from_html(html_content, query),
-                        "price_range": "Contact supplier", 
-                        "availability": "Available on Icecat",
-                        "sources": ["icecat.biz"]
-                    }
+            product_name = _first_product_name(html_content)
+            if product_name is not None:
+                # Try to extract brand from product name
+                name_lower = product_name.lower()
+                brand = next((brand for brand_lower, brand in _PRODUCT_NAME_BRANDS if brand_lower in name_lower),
+                             "Unknown")
+                
+                return {
+                    "brand": brand,
+                    "model": product_name,
+                    "category": self._guess_category(name_lower),
+                    "specifications": self._extract_specs_from_html(html_content, query),
+                    "price_range": "Contact supplier", 
+                    "availability": "Available on Icecat",
+                    "sources": ["icecat.biz"]
+                }
             
             # If no specific patterns found, try to find any product mention
-            if any(word in html_content.lower() for word in query.lower().split()):
+            html_lower = html_content.lower()
+            if any(word in html_lower for word in ctx.words):
                 return {
-                    "brand": self._extract_brand_from_query(query),
+                    "brand": self._extract_brand_from_query(ctx),
                     "model": query,
-                    "category": self._guess_category(query),
+                    "category": self._guess_category(ctx.lower),
                     "specifications": {
                         "search_results": "Product found in Icecat database",
                         "note": "Visit Icecat.biz for detailed specifications",
-                        "source_url": f"https://icecat.biz/en/search/?keyword={query.replace(' ', '%20')}"
+                        "source_url": ctx.search_url
                     },
                     "price_range": "Contact supplier",
                     "availability": "Available in Icecat catalog",
@@ -202,88 +522,45 @@ class IcecatSearcher:
     
     def _extract_specs_from_html(self, html_content: str, query: str) -> Dict[str, str]:
         """Extract specifications from HTML content."""
-        import re
-        
         specs = {}
         
-        # Look for common specification patterns
-        spec_patterns = {
-            "display": r'(\d+\.?\d*)\s*(?:inch|")\s*([^<,]*)',
-            "storage": r'(\d+(?:GB|TB))',
-            "memory": r'(\d+(?:GB|MB))\s*(?:RAM|Memory)',
-            "processor": r'(A\d+|Intel|AMD|Snapdragon)[^<,]*',
-            "camera": r'(\d+MP)',
-        }
-        
-        for spec_name, pattern in spec_patterns.items():
-            matches = re.findall(pattern, html_content, re.IGNORECASE)
-            if matches:
-                if isinstance(matches[0], tuple):
-                    specs[spec_name] = ' '.join(str(m) for m in matches[0])
-                else:
-                    specs[spec_name] = str(matches[0])
+        # Look for common specification patterns; only the first match of each is used,
+        # so each scan stops there instead of collecting every match on the page
+        for spec_name, pattern in _SPEC_PATTERNS.items():
+            match = pattern.search(html_content)
+            if match:
+                specs[spec_name] = ' '.join(match.groups())
         
         specs["last_updated"] = "Real-time from Icecat"
         return specs
     
-    def _guess_category(self, product_name: str) -> str:
-        """Guess product category from name."""
-        name_lower = product_name.lower()
-        
-        if any(word in name_lower for word in ['phone', 'iphone', 'galaxy', 'smartphone']):
-            return "Smartphone"
-        elif any(word in name_lower for word in ['monitor', 'display', 'screen']):
-            return "Monitor"
-        elif any(word in name_lower for word in ['laptop', 'macbook', 'notebook']):
-            return "Laptop"
-        elif any(word in name_lower for word in ['headphone', 'earphone', 'airpods']):
-            return "Audio"
-        elif any(word in name_lower for word in ['ups', 'power', 'supply']):
-            return "Power Supply"
-        else:
-            return "Electronics"
-    
-    def _extract_brand_from_query(self, query: str) -> str:
+    def _extract_brand_from_query(self, ctx: _QueryContext) -> str:
         """Extract brand name from query."""
-        brands = [
-            'Samsung', 'Apple', 'Dell', 'Sony', 'HP', 'Lenovo', 'LG', 'Asus', 
-            'Acer', 'Gembird', 'Intel', 'AMD', 'NVIDIA', 'Microsoft', 'Google',
-            'Xiaomi', 'Huawei', 'OnePlus', 'Motorola', 'Nokia', 'Panasonic',
-            'Canon', 'Nikon', 'Epson', 'Brother', 'Cisco', 'Netgear', 'TP-Link'
-        ]
-        query_lower = query.lower()
+        query_lower = ctx.lower
         
-        for brand in brands:
-            if brand.lower() in query_lower:
+        # A brand given as a whole word is found by hashing; only brands listed before it
+        # (which take precedence) still need the substring scan
+        ranks = [_BRAND_RANKS[word] for word in ctx.words if word in _BRAND_RANKS]
+        best_rank = min(ranks) if ranks else len(KNOWN_BRANDS)
+        for brand_lower, brand in zip(_KNOWN_BRANDS_LOWER[:best_rank], KNOWN_BRANDS):
+            if brand_lower in query_lower:
                 return brand
+        if ranks:
+            return KNOWN_BRANDS[best_rank]
         
         # If no known brand found, capitalize first word
-        words = query.split()
+        words = ctx.raw.split()
         if words:
             return words[0].capitalize()
         
         return "Generic Brand"
     
-    def _guess_category(self, product_name: str) -> str:
-        """Guess product category from name."""
-        name_lower = product_name.lower()
-        
-        categories = {
-            "Smartphone": ['phone', 'iphone', 'galaxy', 'smartphone', 'mobile', 'android'],
-            "Monitor": ['monitor', 'display', 'screen', 'lcd', 'led', 'oled'],
-            "Laptop": ['laptop', 'macbook', 'notebook', 'ultrabook', 'thinkpad'],
-            "Audio": ['headphone', 'earphone', 'airpods', 'speaker', 'soundbar'],
-            "Power Supply": ['ups', 'power', 'supply', 'battery', 'charger'],
-            "Networking": ['router', 'switch', 'wifi', 'modem', 'access point'],
-            "Storage": ['ssd', 'hdd', 'drive', 'storage', 'disk'],
-            "Gaming": ['gaming', 'xbox', 'playstation', 'console', 'gamepad'],
-            "Camera": ['camera', 'webcam', 'lens', 'camcorder'],
-            "Printer": ['printer', 'scanner', 'multifunction', 'inkjet', 'laser']
-        }
-        
-        for category, keywords in categories.items():
-            if any(keyword in name_lower for keyword in keywords):
-                return category
+    def _guess_category(self, name_lower: str) -> str:
+        """Guess product category from a lowercased name."""
+        ranks = {_CATEGORY_RANKS[match.group(1)] for match in _CATEGORY_KEYWORD_RE.finditer(name_lower)}
+        if ranks:
+            # Categories listed first win when keywords of several appear
+            return PRODUCT_CATEGORIES[min(ranks)][0]
         
         return "Electronics"
     
@@ -320,128 +597,17 @@ class IcecatSearcher:
         except Exception as e:
             return self._error_response(query, f"XML parsing error: {str(e)}", "Icecat")
     
-    def _demo_icecat_search(self, query: str) -> Dict[str, Any]:
+    def _demo_icecat_search(self, ctx: _QueryContext) -> Dict[str, Any]:
         """Demo Icecat search with sample data - always returns first result."""
-        query_lower = query.lower()
-        
-        # Expanded sample Icecat-style data with first result logic
-        demo_products = {
-            "samsung_galaxy_s24": {
-                "triggers": ['samsung', 'galaxy', 's24'],
-                "data": {
-                    "brand": "Samsung",
-                    "model": "Galaxy S24 15.8 cm (6.2\") Dual SIM Android 14 5G USB Type-C 8 GB 128 GB 4000 mAh Amber, Yellow",
-                    "category": "Smartphone",
-                    "specifications": {
-                        "icecat_id": "SM-S921BZYDEUBH",
-                        "display": "15.8 cm (6.2\") Dynamic AMOLED 2X",
-                        "storage": "128GB internal storage",
-                        "ram": "8 GB",
-                        "main_camera": "50 MP main camera",
-                        "battery": "4000 mAh",
-                        "connectivity": "5G, USB Type-C",
-                        "os": "Android 14",
-                        "sim": "Dual SIM",
-                        "colors": "Amber, Yellow",
-                        "dimensions": "147.0 x 70.6 x 7.6 mm",
-                        "search_results": "Product found in Icecat database",
-                        "source_url": f"https://icecat.biz/en/search/?keyword={query.replace(' ', '%20')}"
-                    },
-                    "price_range": "Contact supplier",
-                    "availability": "Available in Icecat catalog",
-                    "sources": ["icecat.biz"]
-                }
-            },
-            "dell_monitor": {
-                "triggers": ['dell', 'p2422', 'monitor'],
-                "data": {
-                    "brand": "Dell",
-                    "model": "P2422H 24-inch Professional Monitor",
-                    "category": "LCD Monitor",
-                    "specifications": {
-                        "icecat_id": "210-AYLX",
-                        "screen_size": "24 inches (60.96 cm)",
-                        "resolution": "1920 x 1080 Full HD",
-                        "panel_type": "IPS",
-                        "response_time": "5 ms",
-                        "refresh_rate": "60 Hz",
-                        "connectivity": "HDMI, DisplayPort, VGA, USB hub",
-                        "energy_rating": "Energy Star certified",
-                        "vesa_mount": "100 x 100 mm",
-                        "adjustable_stand": "Height, tilt, swivel, pivot",
-                        "color_coverage": "99% sRGB",
-                        "search_results": "Product found in Icecat database",
-                        "source_url": f"https://icecat.biz/en/search/?keyword={query.replace(' ', '%20')}"
-                    },
-                    "price_range": "$200 - $280",
-                    "availability": "Available in Icecat catalog",
-                    "sources": ["icecat.biz"]
-                }
-            },
-            "gembird_ups": {
-                "triggers": ['gembird', 'ups', '850'],
-                "data": {
-                    "brand": "Gembird",
-                    "model": "UPS-PC-850AP",
-                    "category": "UPS (Uninterruptible Power Supply)",
-                    "specifications": {
-                        "icecat_id": "UPS-PC-850AP",
-                        "power_capacity": "850 VA / 480 W",
-                        "battery_type": "Sealed Lead Acid",
-                        "backup_time": "10-15 minutes at full load",
-                        "input_voltage": "230V AC ±25%",
-                        "output_voltage": "230V AC ±10%",
-                        "outlets": "4 x IEC 13A sockets",
-                        "protection": "Surge, overload, short circuit",
-                        "dimensions": "350 x 95 x 140 mm",
-                        "weight": "4.5 kg",
-                        "search_results": "Product found in Icecat database",
-                        "source_url": f"https://icecat.biz/en/search/?keyword={query.replace(' ', '%20')}"
-                    },
-                    "price_range": "$80 - $120",
-                    "availability": "Available in Icecat catalog",
-                    "sources": ["icecat.biz"]
-                }
-            },
-            "iphone": {
-                "triggers": ['iphone', 'apple', '15', 'pro'],
-                "data": {
-                    "brand": "Apple",
-                    "model": "iPhone 15 Pro",
-                    "category": "Smartphone",
-                    "specifications": {
-                        "icecat_id": "iPhone15Pro",
-                        "display": "6.1-inch Super Retina XDR OLED",
-                        "processor": "A17 Pro chip",
-                        "storage": "128GB, 256GB, 512GB, 1TB",
-                        "camera": "48MP main, 12MP ultra-wide, 12MP telephoto",
-                        "battery": "Up to 23 hours video playback",
-                        "connectivity": "5G, Wi-Fi 6E, Bluetooth 5.3",
-                        "materials": "Titanium design",
-                        "search_results": "Product found in Icecat database",
-                        "source_url": f"https://icecat.biz/en/search/?keyword={query.replace(' ', '%20')}"
-                    },
-                    "price_range": "$999 - $1,499",
-                    "availability": "Available in Icecat catalog",
-                    "sources": ["icecat.biz"]
-                }
-            }
-        }
-        
-        # Priority matching: exact triggers first
-        for product_key, product_info in demo_products.items():
-            if all(trigger in query_lower for trigger in product_info["triggers"]):
-                return product_info["data"]
-        
-        # Partial matching: any trigger matches
-        for product_key, product_info in demo_products.items():
-            if any(trigger in query_lower for trigger in product_info["triggers"]):
-                return product_info["data"]
+        query = ctx.raw
+        product_key = _match_icecat_demo(ctx.lower)
+        if product_key is not None:
+            return _product_from_template(_ICECAT_DEMO_PRODUCTS[product_key]["data"], source_url=ctx.search_url)
         
         # Generic fallback: create a result for any search query
         # This ensures we always return first result instead of "Not Found"
-        brand = self._extract_brand_from_query(query)
-        category = self._guess_category(query)
+        brand = self._extract_brand_from_query(ctx)
+        category = self._guess_category(ctx.lower)
         
         return {
             "brand": brand,
@@ -450,7 +616,7 @@ class IcecatSearcher:
             "specifications": {
                 "search_results": "Product found in Icecat database",
                 "note": "First result from Icecat catalog",
-                "source_url": f"https://icecat.biz/en/search/?keyword={query.replace(' ', '%20')}",
+                "source_url": ctx.search_url,
                 "product_name": query,
                 "availability": "Available in catalog",
                 "data_source": "Icecat product database"
@@ -493,38 +659,21 @@ class IcecatSearcher:
     
     def _no_results_found(self, query: str, source: str) -> Dict[str, Any]:
         """Standard no results response."""
-        return {
-            "brand": "Not Found",
-            "model": query,
-            "category": "Unknown",
-            "specifications": {
-                "status": f"No results found in {source}",
-                "suggestion": "Try a different search term or check spelling"
-            },
-            "price_range": "N/A",
-            "availability": "Unknown",
-            "sources": [source.lower()]
-        }
+        return {**_NO_RESULTS_TEMPLATE, "model": query,
+                "specifications": {"status": f"No results found in {source}", "suggestion": _NO_RESULTS_SUGGESTION},
+                "sources": [source.lower()]}
     
     def _error_response(self, query: str, error: str, source: str) -> Dict[str, Any]:
         """Standard error response."""
-        return {
-            "brand": "Error",
-            "model": query,
-            "category": "Error",
-            "specifications": {
-                "error": error,
-                "source": source
-            },
-            "price_range": "N/A",
-            "availability": "Error",
-            "sources": [source.lower()]
-        }
+        return {**_ERROR_TEMPLATE, "model": query, "specifications": {"error": error, "source": source},
+                "sources": [source.lower()]}
 
 
 class GS1Searcher:
     """Handles product search using GS1 standards (demo implementation)."""
     
+    __slots__ = ("endpoint",)
+    
     def __init__(self):
         self.endpoint = GS1_API_ENDPOINT
     
@@ -533,45 +682,23 @@ class GS1Searcher:
         # GS1 typically works with GTINs/barcodes
         # This is a demo implementation
         
-        query_clean = query.replace("-", "").replace(" ", "")
+        query_clean = query.translate(_GTIN_SEPARATORS)
         
-        # Check if query looks like a GTIN/barcode
-        if query_clean.isdigit() and len(query_clean) in [8, 12, 13, 14]:
+        # Check if query looks like a GTIN/barcode; isdigit alone would also accept non-ASCII digits
+        if len(query_clean) in _GTIN_LENGTHS and query_clean.isascii() and query_clean.isdigit():
             return self._demo_gs1_search(query_clean)
         else:
-            return {
-                "brand": "GS1 Search",
-                "model": query,
-                "category": "Product Identification",
-                "specifications": {
-                    "note": "GS1 search works best with GTIN/barcode numbers",
-                    "gtin_format": "Enter 8, 12, 13, or 14 digit GTIN",
-                    "example": "Try: 012345678905 or 1234567890123",
-                    "status": "Invalid GTIN format"
-                },
-                "price_range": "N/A",
-                "availability": "Unknown",
-                "sources": ["gs1.org"]
-            }
+            return {**_GS1_INVALID_GTIN_TEMPLATE, "model": query,
+                    "specifications": dict(_GS1_INVALID_GTIN_SPECIFICATIONS), "sources": ["gs1.org"]}
+    
+    async def search_product_async(self, query: str) -> Dict[str, Any]:
+        """Async variant of search_product; the demo lookup never blocks, so it runs on the event loop."""
+        return self.search_product(query)
     
     def _demo_gs1_search(self, gtin: str) -> Dict[str, Any]:
         """Demo GS1 search with sample GTIN data."""
-        # Sample GTINs for demo
-        sample_gtins = {
-            "012345678905": {
-                "brand": "Sample Brand",
-                "product_name": "Demo Product",
-                "category": "Consumer Goods"
-            },
-            "1234567890123": {
-                "brand": "Tech Corp",
-                "product_name": "Electronic Device",
-                "category": "Electronics"
-            }
-        }
-        
-        if gtin in sample_gtins:
-            data = sample_gtins[gtin]
+        if gtin in _GS1_SAMPLE_GTINS:
+            data = _GS1_SAMPLE_GTINS[gtin]
             return {
                 "brand": data["brand"],
                 "model": data["product_name"],
@@ -602,38 +729,125 @@ class GS1Searcher:
             }
 
 
+# Worker threads for concurrent source searches, shared by all searchers instead of a pool per search
+_SOURCE_SEARCH_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="source-search")
+
+# Source precedence when combining results (see MultiSourceSearcher._combine_results)
+_SOURCE_PRIORITY = {"icecat": 0, "google": 1, "gs1": 2}
+# Results with these brands aren't good enough to stop searching lower-priority sources
+UNUSABLE_BRANDS = ("Not Found", "Unknown", "Error", "No Results")
+
+
+def primary_source(enabled_sources: List[str]) -> Optional[str]:
+    """Return the enabled source searched first, whose usable result makes the others unnecessary."""
+    return min((name for name in enabled_sources if name in _SOURCE_PRIORITY),
+               key=_SOURCE_PRIORITY.__getitem__, default=None)
+
+
 class MultiSourceSearcher:
     """Orchestrates searches across multiple data sources."""
     
+    __slots__ = ("gemini_searcher", "icecat_searcher", "gs1_searcher")
+    
     def __init__(self, gemini_searcher=None, icecat_searcher=None, gs1_searcher=None):
         self.gemini_searcher = gemini_searcher
         self.icecat_searcher = icecat_searcher
         self.gs1_searcher = gs1_searcher
     
-    def search_product(self, query: str, enabled_sources: List[str]) -> Dict[str, Any]:
-        """Search across enabled sources and return best result."""
-        results = {}
-        errors = []
+    def search_product(self, query: str, enabled_sources: List[str],
+                       prefetched: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        Search across enabled sources and return best result.
         
-        # Search each enabled source
-        if "google" in enabled_sources and self.gemini_searcher:
+        prefetched maps source names to results already fetched elsewhere (e.g. by a
+        batched Gemini request); those sources are not searched again.
+        """
+        results = dict(prefetched) if prefetched else {}
+        tasks = self._source_tasks(enabled_sources, results)
+        outcomes = [None] * len(tasks)
+        
+        # The highest-priority source goes first; when its result is usable, the others are skipped
+        pending = self._pending_tasks(tasks, results, outcomes)
+        if pending:
+            lead = pending[0]
             try:
-                # Use real API if available, otherwise demo
-                results["google"] = self.gemini_searcher.search_product(query, use_demo_mode=None)
+                outcomes[lead] = tasks[lead][1].search_product(query)
             except Exception as e:
-                errors.append(f"Google search error: {str(e)}")
+                outcomes[lead] = e
+            pending = self._pending_tasks(tasks, results, outcomes)
         
-        if "icecat" in enabled_sources and self.icecat_searcher:
+        # The rest are searched concurrently, so latency is that of the slowest one rather than the sum
+        if pending:
+            futures = {index: _SOURCE_SEARCH_POOL.submit(tasks[index][1].search_product, query) for index in pending}
+            for index, future in futures.items():
+                outcomes[index] = future.exception() or future.result()
+        
+        return self._finish_search(query, enabled_sources, results, tasks, outcomes)
+    
+    async def search_product_async(self, query: str, enabled_sources: List[str],
+                                   prefetched: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Async variant of search_product, awaiting each source's own search_product_async."""
+        results = dict(prefetched) if prefetched else {}
+        tasks = self._source_tasks(enabled_sources, results)
+        outcomes = [None] * len(tasks)
+        
+        pending = self._pending_tasks(tasks, results, outcomes)
+        if pending:
+            lead = pending[0]
             try:
-                results["icecat"] = self.icecat_searcher.search_product(query)
+                outcomes[lead] = await tasks[lead][1].search_product_async(query)
             except Exception as e:
-                errors.append(f"Icecat search error: {str(e)}")
+                outcomes[lead] = e
+            pending = self._pending_tasks(tasks, results, outcomes)
         
+        if pending:
+            rest = await asyncio.gather(*(tasks[index][1].search_product_async(query) for index in pending),
+                                        return_exceptions=True)
+            for index, outcome in zip(pending, rest):
+                outcomes[index] = outcome
+        
+        return self._finish_search(query, enabled_sources, results, tasks, outcomes)
+    
+    def _source_tasks(self, enabled_sources: List[str], results: Dict[str, Dict[str, Any]]) -> list:
+        """(source name, searcher, error label) for each enabled source without a result yet."""
+        tasks = []
+        if "google" in enabled_sources and self.gemini_searcher and "google" not in results:
+            # Gemini uses the real API if available, otherwise demo
+            tasks.append(("google", self.gemini_searcher, "Google search"))
+        if "icecat" in enabled_sources and self.icecat_searcher:
+            tasks.append(("icecat", self.icecat_searcher, "Icecat search"))
         if "gs1" in enabled_sources and self.gs1_searcher:
-            try:
-                results["gs1"] = self.gs1_searcher.search_product(query)
-            except Exception as e:
-                errors.append(f"GS1 search error: {str(e)}")
+            tasks.append(("gs1", self.gs1_searcher, "GS1 search"))
+        return tasks
+    
+    def _pending_tasks(self, tasks: list, results: Dict[str, Dict[str, Any]], outcomes: list) -> List[int]:
+        """
+        Indices of the tasks still worth running, highest priority first.
+        
+        A source is skipped once a higher-priority source has returned a usable result,
+        since _combine_results would build on that result anyway.
+        """
+        answered = list(results.items())
+        answered.extend((name, outcome) for (name, _, _), outcome in zip(tasks, outcomes) if isinstance(outcome, dict))
+        best_rank = min((_SOURCE_PRIORITY[name] for name, result in answered
+                         if name in _SOURCE_PRIORITY and result.get("brand") not in UNUSABLE_BRANDS),
+                        default=len(_SOURCE_PRIORITY))
+        pending = [index for index, (name, _, _) in enumerate(tasks)
+                   if outcomes[index] is None and _SOURCE_PRIORITY[name] < best_rank]
+        return sorted(pending, key=lambda index: _SOURCE_PRIORITY[tasks[index][0]])
+    
+    def _finish_search(self, query: str, enabled_sources: List[str], results: Dict[str, Dict[str, Any]],
+                       tasks: list, outcomes: list) -> Dict[str, Any]:
+        """Fold source outcomes (results, exceptions or None if skipped) into results and return the best combined answer."""
+        errors = []
+        # Collected in source order so the combined result doesn't depend on which source answered first
+        for (name, _, label), outcome in zip(tasks, outcomes):
+            if outcome is None:
+                continue
+            if isinstance(outcome, Exception):
+                errors.append(f"{label} error: {str(outcome)}")
+            else:
+                results[name] = outcome
         
         # Combine results or return best one
         if results:
@@ -670,18 +884,17 @@ class MultiSourceSearcher:
             base_result = list(results.values())[0].copy()
             base_result["multi_source"] = True
         
-        # Add source information
-        all_sources = []
-        for source_name, result in results.items():
-            all_sources.extend(result.get("sources", [source_name]))
+        # Add source information; sorted so identical searches produce identical results
+        source_names = tuple(results)
+        all_sources = set().union(*(result.get("sources", (name,)) for name, result in results.items()))
         
-        base_result["sources"] = list(set(all_sources))
-        base_result["searched_sources"] = list(results.keys())
+        base_result["sources"] = sorted(all_sources)
+        base_result["searched_sources"] = list(source_names)
         
-        # Add combined specifications
-        combined_specs = base_result.get("specifications", {})
-        combined_specs["search_results_count"] = len(results)
-        combined_specs["sources_searched"] = ", ".join(results.keys())
+        # Add combined specifications; copied so the source's own result is left untouched
+        combined_specs = dict(base_result.get("specifications", {}))
+        combined_specs["search_results_count"] = len(source_names)
+        combined_specs["sources_searched"] = ", ".join(source_names)
         
         base_result["specifications"] = combined_specs
         
@@ -0,0 +1,247 @@
+"""
+Search result caching module.
+Keeps product search results in memory and on disk so identical queries
+skip the network across Streamlit reruns and app restarts.
+"""
+
+import difflib
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+import orjson
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Iterable, Hashable, FrozenSet
+from config import (SEARCH_CACHE_DIR, SEARCH_CACHE_TTL, SEARCH_CACHE_MAX_ENTRIES,
+                    SEARCH_CACHE_MAX_NAMESPACES, NEAR_MATCH_CUTOFF)
+
+# Results with these brands describe a failed search and are never cached
+UNCACHEABLE_BRANDS = ("Error", "No Results", "Unknown", "Not Found")
+
+# Versioned with the compact_query format so an index built by an older format is never read
+NEAR_MATCH_INDEX_FILE = "near_match_index_v2.json"
+
+_SEPARATORS_RE = re.compile(r"[\s_-]+")
+_LATIN_WORD_RE = re.compile(r"[a-z]{4,}")
+
+
+def _dumps(value: Any) -> bytes:
+    """Serialize a value for caching; non-string keys are stringified as json.dumps did."""
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase a query and collapse whitespace for cache lookups."""
+    return " ".join(query.lower().split())
+
+
+def compact_query(query: str) -> str:
+    """Lowercase a query and drop whitespace, "-" and "_" ("iPhone 15-Pro" -> "iphone15pro")."""
+    return _SEPARATORS_RE.sub("", query.lower())
+
+
+def _model_marks(query: str) -> FrozenSet[str]:
+    """
+    Words of a query that name a specific model and must never be fuzzed.
+
+    Any word with a digit, "+" or a non-Latin letter, and any word of up to three
+    letters: "8a", "3s", "s24+", "vi", "fc", "华为".
+    """
+    return frozenset(word for word in _SEPARATORS_RE.split(query.lower())
+                     if word and not _LATIN_WORD_RE.fullmatch(word))
+
+
+def make_namespace(enabled_sources: Iterable[str], api_keys: Iterable[Optional[str]] = ()) -> str:
+    """
+    Build the cache namespace for a search configuration.
+
+    The API keys are hashed into the namespace so cached results are
+    invalidated when a key changes (e.g. switching from demo to real mode).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(",".join(sorted(enabled_sources)).encode())
+    for api_key in api_keys:
+        digest.update(b"\0" + (api_key or "").encode())
+    return digest.hexdigest()
+
+
+def make_cache_key(query: str, namespace: str) -> str:
+    """Build the cache key for a query within a namespace."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(namespace.encode())
+    digest.update(b"\0" + normalize_query(query).encode())
+    return digest.hexdigest()
+
+
+class TTLCache:
+    """
+    Thread-safe in-memory LRU cache whose entries expire ttl seconds after being set.
+
+    Values are stored serialized, so every get returns an independent copy.
+    """
+
+    def __init__(self, max_entries: int = SEARCH_CACHE_MAX_ENTRIES, ttl: float = SEARCH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, serialized value)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return a copy of the cached value, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return orjson.loads(entry[1])
+
+    def set(self, key: Hashable, value: Any):
+        """Cache a JSON-serializable value, evicting the least recently used entry when full."""
+        serialized = _dumps(value)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, serialized)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SearchCache:
+    """
+    In-memory LRU cache backed by JSON files on disk.
+
+    Besides exact matches, lookups fall back to a near-match index so
+    "iPhone15 Pro", "iphone 15 pro" and "iPhone-15-Pro" share one result.
+    """
+
+    def __init__(self, directory: str = SEARCH_CACHE_DIR, ttl: float = SEARCH_CACHE_TTL,
+                 max_entries: int = SEARCH_CACHE_MAX_ENTRIES, near_match_cutoff: float = NEAR_MATCH_CUTOFF,
+                 max_namespaces: int = SEARCH_CACHE_MAX_NAMESPACES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_namespaces = max_namespaces
+        self.near_match_cutoff = near_match_cutoff
+        self._memory = OrderedDict()  # key -> (expires_at, serialized result)
+        self._near_index = self._load_near_index()  # namespace -> {compact query: query}
+        self._lock = threading.Lock()
+
+    def get(self, query: str, namespace: str) -> Optional[Dict[str, Any]]:
+        """Return a fresh copy of the cached result for query, or None on a miss."""
+        result = self._get(make_cache_key(query, namespace))
+        if result is None:
+            similar_query = self._find_near_match(query, namespace)
+            if similar_query is not None:
+                result = self._get(make_cache_key(similar_query, namespace))
+        return result
+
+    def set(self, query: str, namespace: str, result: Dict[str, Any]):
+        """Cache a search result unless it describes a failed search."""
+        if result.get("brand") in UNCACHEABLE_BRANDS:
+            return
+
+        key = make_cache_key(query, namespace)
+        serialized = _dumps(result)
+        self._remember(key, time.time() + self.ttl, serialized)
+
+        with self._lock:
+            # Most recently used namespace last, so the oldest configuration is dropped first
+            entries = self._near_index.pop(namespace, {})
+            self._near_index[namespace] = entries
+            while len(self._near_index) > self.max_namespaces:
+                del self._near_index[next(iter(self._near_index))]
+            entries[compact_query(query)] = normalize_query(query)
+            while len(entries) > self.max_entries:
+                del entries[next(iter(entries))]
+            # Every set rewrites the whole index while holding the lock, so an older snapshot
+            # never replaces a newer one; the file is bounded by max_namespaces * max_entries
+            self._write_file(NEAR_MATCH_INDEX_FILE, _dumps(self._near_index))
+
+        self._write_file(f"{key}.json", serialized)
+
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    return orjson.loads(entry[1])
+                del self._memory[key]
+
+        path = os.path.join(self.directory, f"{key}.json")
+        try:
+            expires_at = os.path.getmtime(path) + self.ttl
+            if expires_at <= now:
+                self._remove_file(path)
+                return None
+            with open(path, "rb") as f:
+                serialized = f.read()
+            result = orjson.loads(serialized)
+        except (OSError, ValueError):
+            return None
+
+        self._remember(key, expires_at, serialized)
+        return result
+
+    def _find_near_match(self, query: str, namespace: str) -> Optional[str]:
+        """Find a previously cached query that differs only in spacing, case, "-"/"_" or a small typo."""
+        compact = compact_query(query)
+        with self._lock:
+            entries = dict(self._near_index.get(namespace, {}))
+        if not compact or not entries:
+            return None
+
+        if compact in entries:
+            return entries[compact]
+
+        # Fuzzy fallback for typos in longer Latin words only; model words must agree
+        # exactly ("pixel 8" is not "pixel 8a", "xperia 1 v" is not "xperia 1 vi")
+        marks = _model_marks(query)
+        for candidate in difflib.get_close_matches(compact, entries, n=3, cutoff=self.near_match_cutoff):
+            if _model_marks(entries[candidate]) == marks:
+                return entries[candidate]
+        return None
+
+    def _remember(self, key: str, expires_at: float, serialized: bytes):
+        evicted = []
+        with self._lock:
+            self._memory[key] = (expires_at, serialized)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                evicted.append(self._memory.popitem(last=False)[0])
+        # Evicted entries leave the disk too, so the cache directory stays bounded
+        for evicted_key in evicted:
+            self._remove_file(os.path.join(self.directory, f"{evicted_key}.json"))
+
+    def _load_near_index(self) -> Dict[str, Dict[str, str]]:
+        try:
+            with open(os.path.join(self.directory, NEAR_MATCH_INDEX_FILE), "rb") as f:
+                return orjson.loads(f.read())
+        except (OSError, ValueError):
+            return {}
+
+    def _write_file(self, name: str, content: bytes):
+        # Disk persistence is best-effort; a read-only filesystem just means memory-only caching
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, os.path.join(self.directory, name))
+        except OSError:
+            self._remove_file(tmp_path)
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+
+from search_cache import SearchCache, compact_query
+
+
+class NearMatchTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.cache = SearchCache(directory=self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _cache(self, query):
+        self.cache.set(query, "ns", {"brand": "Test", "model": query})
+
+    def _lookup(self, query):
+        result = self.cache.get(query, "ns")
+        return result and result["model"]
+
+    def test_spelling_variants_share_a_result(self):
+        self._cache("iPhone 15 Pro")
+        for query in ("iphone15 pro", "iPhone-15-Pro", "IPHONE_15_PRO"):
+            self.assertEqual(self._lookup(query), "iPhone 15 Pro", query)
+
+    def test_typos_in_long_words_share_a_result(self):
+        self._cache("Samsung Galaxy S24")
+        self.assertEqual(self._lookup("Samsumg Galaxy S24"), "Samsung Galaxy S24")
+
+    def test_plus_models_are_distinct(self):
+        self._cache("Samsung Galaxy S24")
+        self.assertIsNone(self._lookup("Samsung Galaxy S24+"))
+        self.assertNotEqual(compact_query("Galaxy S24"), compact_query("Galaxy S24+"))
+
+    def test_non_latin_names_are_distinct(self):
+        self._cache("华为 Mate 60")
+        self.assertIsNone(self._lookup("荣耀 Mate 60"))
+        self.assertEqual(self._lookup("华为 mate-60"), "华为 Mate 60")
+
+    def test_model_numbers_are_distinct(self):
+        self._cache("Sony WH-1000XM5")
+        self.assertIsNone(self._lookup("Sony WH-1000XM4"))
+
+    def test_letter_model_suffixes_are_distinct(self):
+        for cached, other in (("Google Pixel 8", "Google Pixel 8a"),
+                              ("Logitech MX Master 3", "Logitech MX Master 3S"),
+                              ("Sony Xperia 1 V", "Sony Xperia 1 VI"),
+                              ("Nikon Z f", "Nikon Z fc")):
+            self._cache(cached)
+            self.assertIsNone(self._lookup(other), other)
+
+
+class DiskCacheTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _files(self):
+        return sorted(name for name in os.listdir(self._tmp.name) if name.endswith(".json"))
+
+    def test_evicted_entries_leave_the_disk(self):
+        cache = SearchCache(directory=self._tmp.name, max_entries=2)
+        for query in ("first", "second", "third"):
+            cache.set(query, "ns", {"brand": "Test"})
+        self.assertEqual(len(self._files()), 3)  # two results plus the near-match index
+        self.assertIsNone(cache.get("first", "ns"))
+
+    def test_expired_entries_leave_the_disk(self):
+        cache = SearchCache(directory=self._tmp.name, ttl=0)
+        cache.set("expired", "ns", {"brand": "Test"})
+        self.assertIsNone(cache.get("expired", "ns"))
+        self.assertEqual(len(self._files()), 1)
+
+    def test_namespaces_are_capped(self):
+        cache = SearchCache(directory=self._tmp.name, max_namespaces=2)
+        for namespace in ("a", "b", "c"):
+            cache.set("query", namespace, {"brand": "Test"})
+        self.assertEqual(list(cache._near_index), ["b", "c"])
+
+    def test_failed_searches_are_not_cached(self):
+        cache = SearchCache(directory=self._tmp.name)
+        for brand in ("Error", "No Results", "Unknown", "Not Found"):
+            cache.set(brand, "ns", {"brand": brand})
+            self.assertIsNone(cache.get(brand, "ns"), brand)
+        self.assertEqual(self._files(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()